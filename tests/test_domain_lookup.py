@@ -0,0 +1,204 @@
+import asyncio
+import time
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.domain_analysis.domain_lookup import AsyncCache, DomainLookupResponse, DomainLookupTool, LruTtlCache, get_default_domain_lookup_tool
+
+class TestLruTtlCache(unittest.TestCase):
+
+  def test_get_and_set(self):
+    cache = LruTtlCache(maxsize=2)
+    self.assertIsNone(cache.get("a"))
+    self.assertEqual(cache.get("a", "default"), "default")
+    cache.set("a", 1)
+    self.assertEqual(cache.get("a"), 1)
+    self.assertEqual(len(cache), 1)
+
+  def test_evicts_least_recently_used(self):
+    cache = LruTtlCache(maxsize=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    # Reading a makes b the least recently used entry
+    cache.get("a")
+    cache.set("c", 3)
+    self.assertEqual(cache.get("a"), 1)
+    self.assertIsNone(cache.get("b"))
+    self.assertEqual(cache.get("c"), 3)
+    self.assertEqual(len(cache), 2)
+
+  def test_entries_expire_after_ttl(self):
+    cache = LruTtlCache(maxsize=2, default_ttl=0.05)
+    cache.set("a", 1)
+    cache.set("b", 2, ttl=60)
+    self.assertEqual(cache.get("a"), 1)
+    time.sleep(0.1)
+    self.assertIsNone(cache.get("a"))
+    self.assertEqual(cache.get("b"), 2)
+    self.assertEqual(len(cache), 1)
+
+
+class TestAsyncCache(unittest.TestCase):
+
+  def test_concurrent_callers_share_one_call(self):
+    key_list = []
+    async def async_fn(key: str) -> str:
+      key_list.append(key)
+      await asyncio.sleep(0.01)
+      return key * 2
+
+    async def run():
+      async_cache = AsyncCache(async_fn)
+      value_list = await asyncio.gather(*[async_cache.run("a") for _ in range(5)], async_cache.run("b"))
+      self.assertEqual(value_list, ["aa"] * 5 + ["bb"])
+      self.assertEqual(await async_cache.run("a"), "aa")
+      self.assertEqual(async_cache.pending, {})
+    asyncio.run(run())
+    self.assertEqual(key_list, ["a", "b"])
+
+  def test_exception_is_not_cached(self):
+    key_list = []
+    async def async_fn(key: str) -> str:
+      key_list.append(key)
+      await asyncio.sleep(0.01)
+      if len(key_list) == 1:
+        raise ValueError(key)
+      return key
+
+    async def run():
+      async_cache = AsyncCache(async_fn)
+      output_list = await asyncio.gather(*[async_cache.run("a") for _ in range(3)], return_exceptions=True)
+      self.assertTrue(all(isinstance(output, ValueError) for output in output_list))
+      self.assertEqual(await async_cache.run("a"), "a")
+    asyncio.run(run())
+    self.assertEqual(key_list, ["a", "a"])
+
+  def test_call_is_cancelled_once_every_caller_is_cancelled(self):
+    event_list = []
+    async def async_fn(key: str) -> str:
+      try:
+        await asyncio.sleep(0.2)
+      except asyncio.CancelledError:
+        event_list.append("cancelled")
+        raise
+      event_list.append("finished")
+      return key
+
+    async def run():
+      async_cache = AsyncCache(async_fn)
+      first_task = asyncio.ensure_future(async_cache.run("a"))
+      second_task = asyncio.ensure_future(async_cache.run("a"))
+      await asyncio.sleep(0.01)
+
+      # The call keeps running while any caller is still waiting on it
+      first_task.cancel()
+      await asyncio.sleep(0.01)
+      self.assertEqual(event_list, [])
+      second_task.cancel()
+      await asyncio.sleep(0.01)
+      self.assertEqual(event_list, ["cancelled"])
+      self.assertEqual(async_cache.pending, {})
+      self.assertEqual(async_cache.task_to_waiter_count, {})
+      self.assertIsNone(async_cache.cache.get("a"))
+    asyncio.run(run())
+
+  def test_caller_after_cancellation_starts_a_new_call(self):
+    event_list = []
+    async def async_fn(key: str) -> str:
+      try:
+        await asyncio.sleep(0.2)
+      except asyncio.CancelledError:
+        # The cancelled call takes a while to unwind
+        await asyncio.sleep(0.05)
+        event_list.append("cancelled")
+        raise
+      event_list.append("finished")
+      return key
+
+    async def run():
+      async_cache = AsyncCache(async_fn)
+      first_task = asyncio.ensure_future(async_cache.run("a"))
+      await asyncio.sleep(0.01)
+      first_task.cancel()
+      await asyncio.sleep(0.01)
+
+      # The first call is still unwinding when the second caller arrives
+      self.assertEqual(event_list, [])
+      self.assertEqual(await async_cache.run("a"), "a")
+      self.assertEqual(event_list, ["cancelled", "finished"])
+      self.assertEqual(async_cache.pending, {})
+      self.assertEqual(async_cache.cache.get("a"), "a")
+    asyncio.run(run())
+
+
+class FakeDomainLookupTool(DomainLookupTool):
+
+  def __init__(self, rdap_response: dict, async_whois_response: dict):
+    super().__init__()
+    self.rdap_response = rdap_response
+    self.async_whois_response = async_whois_response
+    self.event_list = []
+
+  async def _get_rdap_response_from_registered_domain(self, registered_domain_name: str, httpx_client=None, verbose: bool = True) -> dict:
+    await asyncio.sleep(0.01)
+    self.event_list.append("rdap")
+    return self.rdap_response
+
+  async def _get_async_whois_response_from_registered_domain(self, registered_domain_name: str) -> dict:
+    try:
+      await asyncio.sleep(0.05)
+    except asyncio.CancelledError:
+      self.event_list.append("async whois cancelled")
+      raise
+    self.event_list.append("async whois")
+    return self.async_whois_response
+
+  async def _get_sync_whois_response_from_registered_domain(self, registered_domain_name: str) -> dict:
+    self.event_list.append("sync whois")
+    return {"registrar_name": "sync registrar", "created": "2019-01-01", "nameservers": "ns.example.com"}
+
+
+class TestDomainLookupTool(unittest.TestCase):
+
+  def test_close_shuts_down_the_whois_threads(self):
+    with DomainLookupTool(max_whois_workers=1) as domain_lookup_tool:
+      self.assertEqual(domain_lookup_tool.whois_executor.submit(lambda: "a").result(), "a")
+    with self.assertRaises(RuntimeError):
+      domain_lookup_tool.whois_executor.submit(lambda: "a")
+
+  def test_default_tool_is_shared(self):
+    self.assertIs(get_default_domain_lookup_tool(), get_default_domain_lookup_tool())
+
+
+class TestDomainLookupResponse(unittest.TestCase):
+
+  def from_fqdn(self, domain_lookup_tool: DomainLookupTool) -> DomainLookupResponse:
+    return asyncio.run(DomainLookupResponse.from_fqdn(fqdn="www.example.com", domain_lookup_tool=domain_lookup_tool, httpx_client=object()))
+
+  def test_other_lookups_are_cancelled_once_rdap_returns_the_critical_fields(self):
+    domain_lookup_tool = FakeDomainLookupTool(
+      rdap_response={"registrar_name": "rdap registrar", "created": "2020-01-01"},
+      async_whois_response={}
+    )
+    domain_lookup_response = self.from_fqdn(domain_lookup_tool=domain_lookup_tool)
+    self.assertEqual(domain_lookup_response.registrar_name, "rdap registrar")
+    self.assertEqual(domain_lookup_response.created, "2020-01-01")
+    self.assertEqual(domain_lookup_tool.event_list, ["rdap", "async whois cancelled"])
+
+  def test_sync_whois_only_runs_once_the_other_lookups_miss_the_critical_fields(self):
+    domain_lookup_tool = FakeDomainLookupTool(
+      rdap_response={"registrar_name": "rdap registrar"},
+      async_whois_response={"status": "active"}
+    )
+    domain_lookup_response = self.from_fqdn(domain_lookup_tool=domain_lookup_tool)
+    self.assertEqual(domain_lookup_response.registrar_name, "rdap registrar")
+    self.assertEqual(domain_lookup_response.status, "active")
+    self.assertEqual(domain_lookup_response.created, "2019-01-01")
+    self.assertEqual(domain_lookup_tool.event_list, ["rdap", "async whois", "sync whois"])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,131 @@
+import asyncio
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.classification.utilities.file_utils import AsyncS3Client
+
+class FakeStreamingBody:
+
+  def __init__(self, body: bytes):
+    self.body = body
+
+  async def read(self) -> bytes:
+    return self.body
+
+
+class FakePaginator:
+
+  def __init__(self, key_to_body: dict):
+    self.key_to_body = key_to_body
+
+  async def paginate(self, Bucket: str, Prefix: str):
+    key_list = sorted(key for key in self.key_to_body if key.startswith(Prefix))
+    # Two keys per page, so that listing has to follow the pages
+    for i in range(0, len(key_list), 2):
+      yield {"Contents": [{"Key": key} for key in key_list[i:i + 2]]}
+
+
+class FakeS3Client:
+  """
+  An in-memory stand in for the aioboto3 s3 client, holding the objects of a single bucket
+  """
+
+  def __init__(self, key_to_body: dict, key_to_content_type: dict):
+    self.key_to_body = key_to_body
+    self.key_to_content_type = key_to_content_type
+    self.is_closed = False
+
+  async def __aenter__(self) -> "FakeS3Client":
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    self.is_closed = True
+
+  async def put_object(self, Body: bytes, Bucket: str, Key: str, ContentType: str = None):
+    self.key_to_body[Key] = Body
+    self.key_to_content_type[Key] = ContentType
+
+  async def get_object(self, Bucket: str, Key: str) -> dict:
+    return {"Body": FakeStreamingBody(self.key_to_body[Key])}
+
+  def get_paginator(self, operation_name: str) -> FakePaginator:
+    return FakePaginator(self.key_to_body)
+
+
+class FakeSession:
+
+  def __init__(self):
+    self.key_to_body = {}
+    self.key_to_content_type = {}
+    self.s3_client_list = []
+
+  def client(self, service_name: str) -> FakeS3Client:
+    s3_client = FakeS3Client(key_to_body=self.key_to_body, key_to_content_type=self.key_to_content_type)
+    self.s3_client_list.append(s3_client)
+    return s3_client
+
+
+def get_fake_s3_client() -> AsyncS3Client:
+  async_s3_client = AsyncS3Client(aws_access_key_id="key", aws_secret_access_key="secret")
+  async_s3_client.session = FakeSession()
+  return async_s3_client
+
+
+class TestAsyncS3Client(unittest.TestCase):
+
+  def test_s3_client_is_shared_until_closed(self):
+    async_s3_client = get_fake_s3_client()
+    async def run():
+      async with async_s3_client:
+        await asyncio.gather(*[async_s3_client.write_object(obj=b"a", s3_path=f"s3://bucket/{i}") for i in range(5)])
+        self.assertEqual(await async_s3_client.load_object(s3_path="s3://bucket/0"), b"a")
+        self.assertEqual(await async_s3_client.load_string_list_from_s3(s3_path="s3://bucket/"), ["a"] * 5)
+        self.assertEqual(len(async_s3_client.session.s3_client_list), 1)
+        self.assertFalse(async_s3_client.session.s3_client_list[0].is_closed)
+      self.assertTrue(async_s3_client.session.s3_client_list[0].is_closed)
+
+      # Using the client after it was closed opens a new s3 client
+      await async_s3_client.load_object(s3_path="s3://bucket/0")
+      self.assertEqual(len(async_s3_client.session.s3_client_list), 2)
+      await async_s3_client.close()
+      self.assertTrue(async_s3_client.session.s3_client_list[1].is_closed)
+    asyncio.run(run())
+
+  def test_s3_client_cannot_be_used_from_another_loop(self):
+    async_s3_client = get_fake_s3_client()
+    asyncio.run(async_s3_client.write_object(obj=b"a", s3_path="s3://bucket/a"))
+    with self.assertRaises(RuntimeError):
+      asyncio.run(async_s3_client.load_object(s3_path="s3://bucket/a"))
+
+  def test_closed_s3_client_can_be_used_from_another_loop(self):
+    async_s3_client = get_fake_s3_client()
+    async def write_and_close():
+      async with async_s3_client:
+        await async_s3_client.write_object(obj=b"a", s3_path="s3://bucket/a")
+    asyncio.run(write_and_close())
+    self.assertEqual(asyncio.run(async_s3_client.load_object(s3_path="s3://bucket/a")), b"a")
+    self.assertEqual(len(async_s3_client.session.s3_client_list), 2)
+
+  def test_write_and_load_string_list_round_trip(self):
+    async_s3_client = get_fake_s3_client()
+    async def run():
+      async with async_s3_client:
+        await async_s3_client.write_string_list_to_s3(string_list=["a", "b"], s3_directory_path="s3://bucket/strings")
+        await async_s3_client.write_string_list_to_s3(string_list=["c", "d"], s3_directory_path="s3://bucket/strings", compress=True)
+        return await async_s3_client.load_string_list_from_s3(s3_path="s3://bucket/strings")
+    string_list = asyncio.run(run())
+    self.assertEqual(sorted(string_list), ["a", "b", "c", "d"])
+
+    key_to_content_type = async_s3_client.session.key_to_content_type
+    # Only the compressed file gets the .gz key and the gzip content type
+    self.assertEqual(sorted(key_to_content_type.values(), key=str), [None, "application/gzip"])
+    for key, content_type in key_to_content_type.items():
+      self.assertEqual(key.endswith(".gz"), content_type == "application/gzip")
+      self.assertTrue(key.startswith("strings/"))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,42 @@
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.phishing_stream.keyword_domain_scorer import KeywordDomainScorer
+
+DOMAIN_TO_EXPECTED_SCORE = {
+  "paypal.com.account-verify.info": 199,
+  "*.login.microsoftonline-secure.xyz": 162,
+  "www.google.com": 84,
+  "paypol-login.tk": 147,
+  "com-account-management.info": 113,
+  "mail.example.com": 29,
+  "appleid.apple.com.signin.ga": 209,
+  "xn--80ak6aa92e.com": 35,
+  "a.b": 16,
+}
+
+class TestKeywordDomainScorer(unittest.TestCase):
+
+  @classmethod
+  def setUpClass(cls):
+    cls.keyword_domain_scorer = KeywordDomainScorer()
+
+  def test_score_domain(self):
+    for domain, expected_score in DOMAIN_TO_EXPECTED_SCORE.items():
+      self.assertEqual(self.keyword_domain_scorer.score_domain(domain), expected_score, domain)
+
+  def test_score_many_matches_score_domain(self):
+    # Includes repeated domains, and neighbouring domains that would form a keyword if they were joined without a separator
+    domain_list = list(DOMAIN_TO_EXPECTED_SCORE) + ["paypal.com.account-verify.info", "secure-pay", "pal.example.com", "log", "in.example.com", ""]
+    self.assertEqual(
+      self.keyword_domain_scorer.score_many(domain_list),
+      [self.keyword_domain_scorer.score_domain(domain) for domain in domain_list]
+    )
+    self.assertEqual(self.keyword_domain_scorer.score_many([]), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
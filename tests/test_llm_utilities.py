@@ -0,0 +1,90 @@
+import unittest
+import sys
+import os
+
+import tiktoken
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.classification.llm.utilities import HTMLChunker, get_diff_string_from_html_strings
+
+# Every byte is its own token, so token counts are byte counts
+BYTE_ENCODER = tiktoken.Encoding(
+  name="byte_encoder",
+  pat_str=r"[\s\S]",
+  mergeable_ranks={bytes([i]): i for i in range(256)},
+  special_tokens={}
+)
+
+class TestHTMLChunker(unittest.TestCase):
+
+  def test_fragment_is_not_wrapped_in_document_tags(self):
+    html = "<div>a</div>\n<span>b</span>\n"
+    self.assertEqual(HTMLChunker(max_chunk_token_size=100, encoder=BYTE_ENCODER).split_html(html), [html])
+
+  def test_fragment_chunks(self):
+    html = "<div>aaaa</div><p>bb</p><title>t</title>"
+    self.assertEqual(
+      HTMLChunker(max_chunk_token_size=16, encoder=BYTE_ENCODER).split_html(html),
+      ["<div>aaaa</div>", "<p>bb</p>", "<title>t</title>"]
+    )
+
+  def test_document_keeps_its_own_tags(self):
+    html = "<html><head><title>t</title></head><body><div>a</div></body></html>"
+    self.assertEqual(HTMLChunker(max_chunk_token_size=100, encoder=BYTE_ENCODER).split_html(html), [html])
+
+  def test_long_node_is_split_with_overlap(self):
+    html = "<p>abcdefghij</p>"
+    self.assertEqual(
+      HTMLChunker(max_chunk_token_size=4, max_token_overlap=1, encoder=BYTE_ENCODER).split_html(html),
+      ["<p>a", "abcd", "defg", "ghij", "j</p", "p>"]
+    )
+
+
+LIST_HTML = "".join(f'<li><a href="/item/{i}">Item {i}</a></li>' for i in range(8))
+
+class TestGetDiffStringFromHtmlStrings(unittest.TestCase):
+
+  def test_changed_text(self):
+    self.assertEqual(
+      get_diff_string_from_html_strings("<div>a</div><p>b</p>", "<div>a</div><p>c</p>"),
+      "\nDelete: b\nInsert: c\n\n"
+    )
+
+  def test_inserted_and_deleted_elements(self):
+    self.assertEqual(
+      get_diff_string_from_html_strings("<div>a</div><p>b</p>", "<div>a</div><span>new</span><p>b</p>"),
+      "\nInsert: span>new</span><\n\n"
+    )
+    self.assertEqual(get_diff_string_from_html_strings("<li>x</li><li>y</li>", "<li>x</li>"), "\nDelete: <li>y</li>\n")
+    self.assertEqual(get_diff_string_from_html_strings("<p>same</p>", "<p>same</p>", buffer=2), "\n")
+
+  def test_page_with_many_segments(self):
+    ending_html = LIST_HTML.replace("Item 3<", "Item three<").replace('<li><a href="/item/6">Item 6</a></li>', "")
+    self.assertEqual(
+      get_diff_string_from_html_strings(LIST_HTML, ending_html),
+      '\nDelete: 3\nInsert: three\n\nDelete: href="/item/6">Item 6</a></li><li><a \n\n'
+    )
+    # The "3" that changed is not the first "3" in the page, so the context comes from the position of the diff
+    self.assertEqual(
+      get_diff_string_from_html_strings(LIST_HTML, ending_html, buffer=4),
+      '\nDelete: tem 3</a>\nInsert: tem three</a>\n\nDelete: ><a href="/item/6">Item 6</a></li><li><a href\n\n'
+    )
+
+  def test_buffer_context_of_repeated_text(self):
+    self.assertEqual(
+      get_diff_string_from_html_strings("<b>x</b><i>x</i>", "<b>x</b><i>y</i>", buffer=3),
+      "\nDelete: <i>x</i\nInsert: <i>y</i\n\n"
+    )
+    self.assertEqual(
+      get_diff_string_from_html_strings("<p>a</p>\n<p>b</p>\n", "<p>a</p>\n<p>b</p>\n<p>a</p>\n", buffer=2),
+      "\nInsert: >\n<p>a</p>\n\n"
+    )
+    self.assertEqual(
+      get_diff_string_from_html_strings("<p>a</p><p>b</p><p>a</p>", "<p>a</p><p>b</p>", buffer=2),
+      "\nDelete: p><p>a</p>\n"
+    )
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,103 @@
+import asyncio
+import itertools
+import tempfile
+import time
+import unittest
+from unittest import mock
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.phishing_stream import processor as processor_module
+from url_analyzer.phishing_stream.processor import Processor
+
+class FakeProcessor(Processor):
+  """
+  A Processor with fixed whois and reputation signals, that does not open a log file or start an event loop
+  """
+
+  def __init__(self, whois_multiplier: float, reputation_multiplier: float, run_whois: bool = True):
+    self.run_whois = run_whois
+    self.score_cutoff = 100
+    self.whois_multiplier = whois_multiplier
+    self.reputation_multiplier = reputation_multiplier
+
+  async def scale_score_by_whois_signal(self, score: float, domain: str) -> float:
+    return score * self.whois_multiplier
+
+  def scale_score_by_domain_reputation(self, score: float, domain: str) -> float:
+    return score * self.reputation_multiplier
+
+
+def get_message(issuer: str) -> dict:
+  return {"data": {"leaf_cert": {"issuer": {"O": issuer}}}}
+
+
+def get_printed_line(processor: Processor, score: float, write: mock.Mock) -> str:
+  write.reset_mock()
+  processor.print_score(domain="example.com", score=score)
+  return "" if write.call_count == 0 else write.call_args[0][0]
+
+
+class TestScoreDomain(unittest.TestCase):
+
+  @mock.patch("tqdm.tqdm.write")
+  def test_pruned_lookups_do_not_change_printed_scores(self, write: mock.Mock):
+    # Every whois outcome (no data, old domain, recent domain) and reputation outcome (unknown, known, whitelisted)
+    for whois_multiplier, reputation_multiplier, issuer in itertools.product([1.0, 0.8, 1.2], [1.0, 0.5, 0.0], ["Let's Encrypt", "Other CA"]):
+      processor = FakeProcessor(whois_multiplier=whois_multiplier, reputation_multiplier=reputation_multiplier)
+      message = get_message(issuer=issuer)
+      keyword_score_list = list(range(0, 200))
+      async def score_all():
+        return [await processor.score_domain(domain="example.com", message=message, keyword_score=keyword_score) for keyword_score in keyword_score_list]
+      for keyword_score, score in zip(keyword_score_list, asyncio.run(score_all())):
+        # The score as it was computed before the lookups were pruned, with both signals applied to every domain
+        expected_score = keyword_score * whois_multiplier * reputation_multiplier + (10 if issuer == "Let's Encrypt" else 0)
+        self.assertEqual(
+          get_printed_line(processor=processor, score=score, write=write),
+          get_printed_line(processor=processor, score=expected_score, write=write),
+          (keyword_score, whois_multiplier, reputation_multiplier, issuer)
+        )
+        self.assertEqual(score >= processor.score_cutoff, expected_score >= processor.score_cutoff)
+
+  def test_whois_runs_on_domains_that_can_still_be_printed(self):
+    processor = FakeProcessor(whois_multiplier=1.2, reputation_multiplier=1.0)
+    message = get_message(issuer="Let's Encrypt")
+    # 46 * 1.2 + 10 >= 65, while 45 * 1.2 + 10 < 65
+    self.assertAlmostEqual(asyncio.run(processor.score_domain(domain="example.com", message=message, keyword_score=46)), 46 * 1.2 + 10)
+    self.assertEqual(asyncio.run(processor.score_domain(domain="example.com", message=message, keyword_score=45)), 45 + 10)
+
+
+class TestClose(unittest.TestCase):
+
+  def test_close_stops_the_loop_before_closing_the_log_file(self):
+    with tempfile.TemporaryDirectory() as logs_root_path:
+      with mock.patch.object(processor_module, "LOGS_ROOT_PATH", logs_root_path):
+        processor = Processor(run_whois=False)
+
+      write_error_list = []
+      async def write_domains():
+        try:
+          while True:
+            processor.domain_log_file.write("example.com\n")
+            await asyncio.sleep(0.001)
+        except ValueError as e:
+          write_error_list.append(e)
+      future = asyncio.run_coroutine_threadsafe(write_domains(), processor.loop)
+      time.sleep(0.05)
+
+      processor.close()
+      self.assertFalse(processor.loop_thread.is_alive())
+      self.assertTrue(processor.httpx_client.is_closed)
+      self.assertTrue(processor.domain_log_file.closed)
+      self.assertEqual(write_error_list, [])
+
+      # Cancel the writer that was left on the stopped loop
+      future.cancel()
+      processor.loop.run_until_complete(asyncio.sleep(0.01))
+      processor.loop.close()
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,45 @@
+import random
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.classification.utilities.single_visit_queue import PrefixOptimizedSingleVisitQueue, sort_by_string
+
+class TestPrefixOptimizedSingleVisitQueue(unittest.TestCase):
+
+  def test_add_to_queue_only_once(self):
+    queue = PrefixOptimizedSingleVisitQueue.construct(name="test")
+    self.assertTrue(queue.add_to_queue(value="http://a.com/x"))
+    self.assertFalse(queue.add_to_queue(value="http://a.com/x"))
+    self.assertEqual(queue.pop_from_queue(), "http://a.com/x")
+    self.assertFalse(queue.add_to_queue(value="http://a.com/x"))
+    self.assertTrue(queue.is_empty())
+
+  def test_pop_from_queue_returns_lowest_priority(self):
+    random.seed(0)
+    for _ in range(100):
+      url_list = [
+        "http://" + "/".join(random.choice("abc") * random.randint(1, 3) for _ in range(random.randint(1, 4)))
+        for _ in range(random.randint(1, 30))
+      ]
+      queue = PrefixOptimizedSingleVisitQueue.construct(name="test")
+      for url in url_list:
+        queue.add_to_queue(value=url)
+
+      popped_url_list = []
+      while not queue.is_empty():
+        url_to_priority = {url: queue.prioritization_fn(url) for url in queue.queue}
+        url = queue.pop_from_queue()
+        self.assertEqual(url_to_priority[url], min(url_to_priority.values()))
+        popped_url_list.append(url)
+      self.assertEqual(sorted(popped_url_list), sorted(set(url_list)))
+
+  def test_sort_by_string(self):
+    item_list = ["http://a.com/x", "http://a.com/y", "http://b.com/x", "http://a.com/x"]
+    self.assertEqual(sorted(sort_by_string(item_list=item_list)), sorted(item_list))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,195 @@
+import asyncio
+import unittest
+import sys
+import os
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
+
+from url_analyzer.classification.utilities.utilities import chunked_gather, filter_url, filter_url_list, is_json, memoize
+
+class TestChunkedGather(unittest.TestCase):
+
+  def test_results_are_in_the_order_of_awaitable_list(self):
+    async def sleep_and_return(value: int) -> int:
+      # Later awaitables finish first
+      await asyncio.sleep(0.001 * (20 - value))
+      return value
+
+    for use_subchunking_for_first_iteration in [False, True]:
+      result_list = asyncio.run(chunked_gather(
+        [sleep_and_return(value) for value in range(20)],
+        chunk_size=5,
+        use_subchunking_for_first_iteration=use_subchunking_for_first_iteration
+      ))
+      self.assertEqual(result_list, list(range(20)))
+
+  def test_at_most_chunk_size_awaitables_run_at_once(self):
+    running_count = 0
+    max_running_count = 0
+    async def track_running_count() -> None:
+      nonlocal running_count, max_running_count
+      running_count += 1
+      max_running_count = max(max_running_count, running_count)
+      await asyncio.sleep(0.001)
+      running_count -= 1
+
+    asyncio.run(chunked_gather([track_running_count() for _ in range(30)], chunk_size=4))
+    self.assertEqual(max_running_count, 4)
+
+  def test_task_count_is_bounded_by_chunk_size(self):
+    max_task_count = 0
+    async def track_task_count() -> None:
+      nonlocal max_task_count
+      # The task that runs chunked_gather is counted too
+      max_task_count = max(max_task_count, len(asyncio.all_tasks()) - 1)
+      await asyncio.sleep(0)
+
+    asyncio.run(chunked_gather([track_task_count() for _ in range(1000)], chunk_size=10))
+    self.assertEqual(max_task_count, 10)
+
+  def test_multiple_failures_raise_the_first_failure(self):
+    async def fail(value: int) -> int:
+      # Both failures happen before either one can cancel the other
+      if value in (3, 5):
+        raise ValueError(value)
+      await asyncio.sleep(0.01)
+      return value
+
+    with self.assertLogs("url_analyzer.classification.utilities.utilities", level="ERROR") as log_context:
+      with self.assertRaises(ValueError) as raise_context:
+        asyncio.run(chunked_gather([fail(value) for value in range(8)], chunk_size=8))
+    self.assertEqual(raise_context.exception.args, (3,))
+    self.assertEqual(len(log_context.output), 1)
+    self.assertIn("ValueError(5)", log_context.output[0])
+
+  def test_awaitables_that_never_started_are_closed_after_a_failure(self):
+    async def fail_first(value: int) -> int:
+      if value == 0:
+        raise ValueError(value)
+      await asyncio.sleep(0.01)
+      return value
+
+    coroutine_list = [fail_first(value) for value in range(10)]
+    with self.assertRaises(ValueError):
+      asyncio.run(chunked_gather(coroutine_list, chunk_size=2))
+    # Every coroutine was either run or closed, so none of them warns that it was never awaited
+    self.assertTrue(all(coroutine.cr_frame is None for coroutine in coroutine_list))
+
+
+class TestMemoize(unittest.TestCase):
+
+  def test_is_unbounded_by_default(self):
+    call_list = []
+    @memoize
+    def double(x: int) -> int:
+      call_list.append(x)
+      return x * 2
+
+    for x in range(10000):
+      double(x)
+    self.assertEqual(double(0), 0)
+    self.assertEqual(len(call_list), 10000)
+
+  def test_evicts_least_recently_used_result_at_maxsize(self):
+    call_list = []
+    @memoize(maxsize=2)
+    def double(x: int) -> int:
+      call_list.append(x)
+      return x * 2
+
+    self.assertEqual(double(1), 2)
+    self.assertEqual(double(2), 4)
+    # Reading 1 makes 2 the least recently used result
+    self.assertEqual(double(1), 2)
+    self.assertEqual(double(3), 6)
+    self.assertEqual(call_list, [1, 2, 3])
+    self.assertEqual(double(1), 2)
+    self.assertEqual(double(2), 4)
+    self.assertEqual(call_list, [1, 2, 3, 2])
+
+  def test_evicts_async_results_at_maxsize(self):
+    call_list = []
+    @memoize(maxsize=1)
+    async def double(x: int) -> int:
+      call_list.append(x)
+      return x * 2
+
+    async def run():
+      self.assertEqual(await double(1), 2)
+      self.assertEqual(await double(1), 2)
+      self.assertEqual(await double(2), 4)
+      self.assertEqual(await double(1), 2)
+    asyncio.run(run())
+    self.assertEqual(call_list, [1, 2, 1])
+
+  def test_keys_on_keyword_arguments(self):
+    call_list = []
+    @memoize
+    def join(*args, **kwargs) -> str:
+      call_list.append((args, kwargs))
+      return ",".join([str(arg) for arg in args] + [f"{key}={value}" for key, value in kwargs.items()])
+
+    self.assertEqual(join(1, a=2, b=3), "1,a=2,b=3")
+    self.assertEqual(join(1, a=2, b=3), "1,a=2,b=3")
+    self.assertEqual(len(call_list), 1)
+    # A different keyword argument value is a different call
+    self.assertEqual(join(1, a=2, b=4), "1,a=2,b=4")
+    self.assertEqual(len(call_list), 2)
+    # The same keyword arguments in a different order get their own entry but the same result
+    self.assertEqual(join(1, b=3, a=2), "1,b=3,a=2")
+    self.assertEqual(len(call_list), 3)
+
+  def test_positional_and_keyword_arguments_do_not_collide(self):
+    call_list = []
+    @memoize
+    def describe(*args, **kwargs) -> tuple:
+      call_list.append((args, kwargs))
+      return args, kwargs
+
+    self.assertEqual(describe(1, ("a", 2)), ((1, ("a", 2)), {}))
+    self.assertEqual(describe(1, a=2), ((1,), {"a": 2}))
+    self.assertEqual(describe(1, 2), ((1, 2), {}))
+    self.assertEqual(describe(1, a=2), ((1,), {"a": 2}))
+    self.assertEqual(len(call_list), 3)
+
+
+class TestIsJson(unittest.TestCase):
+
+  def test_strings(self):
+    self.assertTrue(is_json(' {"a": [1, 2]}'))
+    self.assertTrue(is_json("NaN"))
+    self.assertTrue(is_json("123456789012345678901234"))
+    self.assertFalse(is_json("<html></html>"))
+    self.assertFalse(is_json('{"a": '))
+    self.assertFalse(is_json(""))
+
+  def test_non_strings(self):
+    self.assertTrue(is_json(b'{"a": 1}'))
+    self.assertFalse(is_json(b"<html></html>"))
+    self.assertFalse(is_json(None))
+    self.assertFalse(is_json(1))
+
+
+class TestFilterUrl(unittest.TestCase):
+
+  def test_excluded_url_regex_with_inline_flag(self):
+    self.assertFalse(filter_url(url="http://a.com/x", excluded_url_regex_list=["(?i)HTTP.*"]))
+    self.assertFalse(filter_url(url="http://a.com/x", excluded_url_regex_list=["http://b.com/.*", "(?i)HTTP://A.COM/.*"]))
+    self.assertTrue(filter_url(url="http://a.com/x", excluded_url_regex_list=["http://b.com/.*", "(?i)HTTP://C.COM/.*"]))
+
+  def test_excluded_regex_list_with_backreferences_and_repeated_group_names(self):
+    excluded_fqdn_regex_list = [r"(?P<label>\w+)\.(?P=label)\.com", r"(?P<label>\w+)\.example\.com"]
+    self.assertFalse(filter_url(url="http://a.a.com/x", excluded_fqdn_regex_list=excluded_fqdn_regex_list))
+    self.assertFalse(filter_url(url="http://b.example.com/x", excluded_fqdn_regex_list=excluded_fqdn_regex_list))
+    self.assertTrue(filter_url(url="http://a.b.com/x", excluded_fqdn_regex_list=excluded_fqdn_regex_list))
+
+  def test_filter_url_list(self):
+    url_list = ["http://a.com/x", "http://a.com/y", "http://b.com/x"]
+    self.assertEqual(
+      filter_url_list(url_list=url_list, included_fqdn_regex="a\\.com", excluded_url_regex_list=[".*/y"]),
+      ["http://a.com/x"]
+    )
+
+
+if __name__ == '__main__':
+  unittest.main()
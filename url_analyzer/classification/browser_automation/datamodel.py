@@ -105,7 +105,9 @@ class UrlScreenshotResponse(BaseModel):
     If the screenshot bytes is None, fetch the image from s3 first to set it
     """
     if client is None:
-      client = get_client_from_path(path=self.screenshot_path)
+      # The client is only needed for this call, so it is closed once the screenshot is loaded
+      async with get_client_from_path(path=self.screenshot_path) as client:
+        return await self.get_screenshot_bytes(client=client)
         
     screenshot_bytes = await client.load_object(path=self.screenshot_path)
     return screenshot_bytes
@@ -126,6 +128,7 @@ class UrlScreenshotResponse(BaseModel):
     
     # Save the image to the screenshot path
     screenshot_path = response.generate_screenshot_path(image_root_path=image_root_path)
+    is_client_owned = client is None
     if client is None:
       client = get_client_from_path(path=screenshot_path)
         
@@ -146,6 +149,10 @@ class UrlScreenshotResponse(BaseModel):
     else:
       # If the save was successful, set the screenshot path
       response.screenshot_path = screenshot_path
+    finally:
+      # The client is only needed for this call if we created it, so we close it here
+      if is_client_owned:
+        await client.close()
     return response
 
 
@@ -158,9 +165,7 @@ class UrlScreenshotResponse(BaseModel):
 
   async def get_image(self, client: Optional[AsyncFileClient] = None) -> PIL.Image:
     if self.screenshot_path is not None:
-      if client is None:
-        client = get_client_from_path(path=self.screenshot_path)
-      screenshot_bytes = await client.load_object(path=self.screenshot_path)
+      screenshot_bytes = await self.get_screenshot_bytes(client=client)
       image = PIL.Image.open(io.BytesIO(screenshot_bytes)).convert('RGB')
     else:
       image = None
@@ -1,5 +1,6 @@
 import base64
 import json
+import logging
 import os
 
 from dataclasses import dataclass
@@ -14,6 +15,7 @@ from url_analyzer.classification.llm.constants import LLMResponse
 from url_analyzer.classification.llm.utilities import get_token_count_from_prompt
 from url_analyzer.classification.utilities.utilities import Maybe, json_dumps_safe
 
+logger = logging.getLogger(__name__)
 
 DEFAULT_SYSTEM_PROMPT = "You are an extremely powerful and helpful assistant. Please respond to the following prompt"
 ### Conversation Prompts ###
@@ -103,10 +105,12 @@ class MessageManager:
     except Exception as e:
       error = traceback.format_exc()
       maybe_raw_response = Maybe(content=None, error=error)
+      # The messages can contain large base64 images, so we only serialize them when someone is reading debug logs
+      messages_string = json_dumps_safe(self.messages) if logger.isEnabledFor(logging.DEBUG) else f"<{len(self.messages)} messages>"
       print(
         f"""ERROR Calling chat_complete_with_rate_limit_retry with
         --- messages ---
-        messages: {json_dumps_safe(self.messages)}
+        messages: {messages_string}
         ---- kwargs ---
         kwargs: {json_dumps_safe(kwargs)}
         ---- error ---
@@ -1,4 +1,7 @@
-from typing import Any, Callable, Dict, List, Optional, Tuple
+import functools
+import os
+import re
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from dataclasses import dataclass
 from bs4 import BeautifulSoup
 from typing import List, Optional
@@ -11,34 +14,100 @@ import tiktoken
 DEFAULT_ENCODER = tiktoken.encoding_for_model('gpt-3.5-turbo-0125')
 
 
+# Strings up to this length are encoded through the cache. Short html fragments (e.g. <br/>, navbar items) repeat a lot, while long strings rarely do and would crowd them out of the cache
+CACHED_ENCODING_MAX_LENGTH = 256
+
+
+@functools.lru_cache(maxsize=16384)
+def _encode_cached(string: str) -> Tuple[int, ...]:
+  # We return a tuple so that callers cannot mutate the cached encoding
+  return tuple(DEFAULT_ENCODER.encode(string))
+
+
+def encode_string(string: str) -> Sequence[int]:
+  """
+  Encode a string with the default encoder, only caching the encodings of short strings since long strings like whole pages are rarely repeated
+  """
+  return _encode_cached(string) if len(string) <= CACHED_ENCODING_MAX_LENGTH else DEFAULT_ENCODER.encode(string)
+
+
 def get_token_count_from_prompt(prompt: str) -> int:
-  return len(DEFAULT_ENCODER.encode(str(prompt)))
+  return len(encode_string(str(prompt)))
 
 
-def cutoff_string_at_token_count(string: str, max_token_count: Optional[int]) -> str:
+def _cutoff_from_encoded(encoded: Sequence[int], string: str, max_token_count: Optional[int]) -> str:
   """
-  Cutoff a string at a certain token count
+  Cutoff a string at a certain token count, given the already computed encoding of the string
   """
-  encoded = DEFAULT_ENCODER.encode(string)
   if max_token_count is None or len(encoded) <= max_token_count:
     cutoff_string = string
   else:
-    cutoff_string = DEFAULT_ENCODER.decode(encoded[:max_token_count]) + f"...[cutoff {len(encoded) - max_token_count} out of {len(encoded)} total tokens]"
+    cutoff_string = DEFAULT_ENCODER.decode(list(encoded[:max_token_count])) + f"...[cutoff {len(encoded) - max_token_count} out of {len(encoded)} total tokens]"
   return str(cutoff_string)
 
+
+def cutoff_string_at_token_count(string: str, max_token_count: Optional[int]) -> str:
+  """
+  Cutoff a string at a certain token count
+  """
+  if max_token_count is None:
+    # No need to encode the string if there is no cutoff
+    cutoff_string = str(string)
+  else:
+    cutoff_string = _cutoff_from_encoded(encoded=encode_string(string), string=string, max_token_count=max_token_count)
+  return cutoff_string
+
+# The last piece of the text may not end with a separator
+HTML_SEGMENT_PATTERN = re.compile(r"[^>\n]*[>\n]|[^>\n]+")
+
+class HTMLDiffMatchPatch(diff_match_patch):
+  """
+  diff_match_patch that runs its line mode speedup on html segments that end at a ">" or a newline rather than on lines alone. Minified html is often a single line, in which case line mode would never kick in
+  """
+  def diff_linesToChars(self, text1: str, text2: str) -> Tuple[str, str, List[str]]:
+    # The zeroth element is intentionally blank, following diff_match_patch
+    segment_list = [""]
+    segment_to_index = {}
+
+    def segments_to_chars(text: str, max_segment_count: int) -> str:
+      chars = []
+      for match in HTML_SEGMENT_PATTERN.finditer(text):
+        segment = match.group()
+        index = segment_to_index.get(segment)
+        is_out_of_chars = False
+        if index is None:
+          # We run out of characters at chr(1114111), so past that point the rest of the text becomes a single segment
+          is_out_of_chars = len(segment_list) == max_segment_count
+          segment = text[match.start():] if is_out_of_chars else segment
+          segment_list.append(segment)
+          index = segment_to_index[segment] = len(segment_list) - 1
+        chars.append(chr(index))
+        if is_out_of_chars:
+          break
+      return "".join(chars)
+
+    # Allocate 2/3rds of the characters for text1, the rest for text2
+    chars1 = segments_to_chars(text=text1, max_segment_count=666666)
+    chars2 = segments_to_chars(text=text2, max_segment_count=1114111)
+    return chars1, chars2, segment_list
+
+
 def get_diff_string_from_html_strings(starting_html: str, ending_html: str, buffer: int = 0, max_token_count_per_section: Optional[int] = None) -> str:
   """"
   Given two html strings, return a string that describes the differences between them
   """
   if starting_html is None or ending_html is None:
     raise ValueError(f"Both starting_html and ending_html must be provided. starting_html: {starting_html}, ending_html: {ending_html}")
-  dmp = diff_match_patch()
-  # Compute the diff
-  diffs = dmp.diff_main(starting_html, ending_html)
+  dmp = HTMLDiffMatchPatch()
+  # Compute the diff. With checklines the texts are first diffed segment by segment and only the changed segments are diffed character by character
+  diffs = dmp.diff_main(starting_html, ending_html, checklines=True)
   dmp.diff_cleanupSemantic(diffs)
 
-  # Format the diffs into a single string
-  diff_string = ""
+  # Collect the segment for each diff so that they can all be encoded in a single batch
+  diff_string_segment_list = []
+  # The diffs are in order, so we track the position of the current diff in each html string rather than searching for it
+  starting_html_pos = 0
+  ending_html_pos = 0
   for (op, text) in diffs:
 
     # diff_string_segment will be the empty string on unchanged segments
@@ -52,25 +121,57 @@ def get_diff_string_from_html_strings(starting_html: str, ending_html: str, buff
     else:
       # If the buffer is not 0, we present the text with a buffer around it
       if op == 1: # DIFF_INSERT
-        # Find the position of the insertion
-        pos = ending_html.find(text)
+        # The position of the insertion
+        pos = ending_html_pos
         # Extract the surrounding context
         surrounding_context = ending_html[max(0, pos - buffer):pos + len(text) + buffer]
         diff_string_segment =f"Insert: {surrounding_context}"
       elif op == -1: # DIFF_DELETE
-        # Find the position of the deletion
-        pos = starting_html.find(text)
+        # The position of the deletion
+        pos = starting_html_pos
         # Extract the surrounding context
         surrounding_context = starting_html[max(0, pos - buffer):pos + len(text) + buffer]
         diff_string_segment = f"Delete: {surrounding_context}"
 
-    # apply a cutoff on each section based on the token count
-    diff_string_segment = cutoff_string_at_token_count(string=diff_string_segment, max_token_count=max_token_count_per_section) + "\n"
-    diff_string += diff_string_segment
-  return diff_string
+    diff_string_segment_list.append(diff_string_segment)
+    if op != 1: # Not DIFF_INSERT
+      starting_html_pos += len(text)
+    if op != -1: # Not DIFF_DELETE
+      ending_html_pos += len(text)
 
+  # apply a cutoff on each section based on the token count. encode_batch releases the GIL and encodes the segments in parallel
+  if max_token_count_per_section is not None:
+    encoded_segment_list = DEFAULT_ENCODER.encode_batch(diff_string_segment_list, num_threads=os.cpu_count())
+    diff_string_segment_list = [
+      _cutoff_from_encoded(encoded=encoded, string=diff_string_segment, max_token_count=max_token_count_per_section)
+      for diff_string_segment, encoded in zip(diff_string_segment_list, encoded_segment_list)
+    ]
 
+  # Format the diffs into a single string
+  return "".join(diff_string_segment + "\n" for diff_string_segment in diff_string_segment_list)
+
+
+# lxml wraps html fragments in the document tags that they are missing
+IMPLIED_DOCUMENT_TAG_NAME_TO_PATTERN = {
+  tag_name: re.compile(rf"<{tag_name}[\s/>]", re.IGNORECASE)
+  for tag_name in ("html", "head", "body")
+}
 
+def _unwrap_implied_document_tags(soup: BeautifulSoup, html: str) -> BeautifulSoup:
+  """
+  Remove the html, head and body tags that lxml added around a fragment, so that the soup prints as the fragment did with html.parser
+  """
+  for tag_name, pattern in IMPLIED_DOCUMENT_TAG_NAME_TO_PATTERN.items():
+    tag = soup.find(tag_name)
+    if tag is not None and pattern.search(html) is None:
+      tag.unwrap()
+  return soup
+
+
+@functools.lru_cache(maxsize=None)
+def _get_max_token_byte_length(encoder: tiktoken.Encoding) -> int:
+  # The largest number of bytes that a single token can represent
+  return max(len(token_bytes) for token_bytes in encoder.token_byte_values())
 
 
 class HTMLChunker:
@@ -81,42 +182,92 @@ class HTMLChunker:
     self.max_chunk_token_size = max_chunk_token_size
     self.max_token_overlap = max_token_overlap
     self.encoder = encoder
+    self.max_token_byte_length = _get_max_token_byte_length(encoder=encoder)
 
-    self.chunks = []
+    # Chunks are kept as tokens and only decoded once at the end of split_html
+    self.encoded_chunks = []
     self.encoded_current_chunk = []
   
-  def add_string_to_chunk(self, encoded_node_string: List[int]):
+  def add_string_to_chunk(self, encoded_node_string: Sequence[int]):
     assert len(encoded_node_string) <= self.max_chunk_token_size
     
-    if len(self.encoded_current_chunk + encoded_node_string) <= self.max_chunk_token_size:
-      self.encoded_current_chunk += encoded_node_string
+    if len(self.encoded_current_chunk) + len(encoded_node_string) <= self.max_chunk_token_size:
+      self.encoded_current_chunk.extend(encoded_node_string)
     else:
-      self.chunks.append(self.encoder.decode(self.encoded_current_chunk))
-      self.encoded_current_chunk = encoded_node_string
+      self.encoded_chunks.append(self.encoded_current_chunk)
+      # We copy here so that extending the current chunk never mutates the caller's list
+      self.encoded_current_chunk = list(encoded_node_string)
+
+  def can_fit_in_chunk(self, node_string: str) -> bool:
+    # Every token covers at most max_token_byte_length bytes, so a string that is longer than this bound can never fit in a single chunk
+    return len(node_string) <= self.max_chunk_token_size * self.max_token_byte_length
+
+  def is_cacheable(self, node_string: str) -> bool:
+    return self.encoder is DEFAULT_ENCODER and len(node_string) <= CACHED_ENCODING_MAX_LENGTH
+
+  def encode_node_string(self, node_string: str) -> Sequence[int]:
+    return _encode_cached(node_string) if self.is_cacheable(node_string=node_string) else self.encoder.encode(node_string)
 
-  def traverse(self, node: "Node"):
-    encoded_node_string = self.encoder.encode(str(node))
+  def encode_node_string_list(self, node_string_list: List[str]) -> List[Optional[Sequence[int]]]:
+    """
+    Encode all of the node strings that could fit in a chunk, and return None for the rest. Short strings are looked up in the encoding cache and the remaining strings are encoded in a single batch
+    """
+    encoded_node_string_list = [None] * len(node_string_list)
+    index_list = []
+    for i, node_string in enumerate(node_string_list):
+      if self.is_cacheable(node_string=node_string):
+        encoded_node_string_list[i] = _encode_cached(node_string)
+      elif self.can_fit_in_chunk(node_string=node_string):
+        index_list.append(i)
+    if len(index_list) > 0:
+      # encode_batch releases the GIL and encodes the strings in parallel
+      encoded_batch = self.encoder.encode_batch([node_string_list[i] for i in index_list], num_threads=os.cpu_count())
+      for i, encoded_node_string in zip(index_list, encoded_batch):
+        encoded_node_string_list[i] = encoded_node_string
+    return encoded_node_string_list
 
-    if len(encoded_node_string) <= self.max_chunk_token_size:
+  def traverse(self, node: "Node", node_string: Optional[str] = None, encoded_node_string: Optional[Sequence[int]] = None):
+    node_string = node_string if node_string is not None else str(node)
+
+    # We skip encoding the nodes that can never fit in a chunk, which are the largest strings in the tree, unless we need their tokens to split them
+    if encoded_node_string is None and self.can_fit_in_chunk(node_string=node_string):
+      encoded_node_string = self.encode_node_string(node_string=node_string)
+
+    if encoded_node_string is not None and len(encoded_node_string) <= self.max_chunk_token_size:
       self.add_string_to_chunk(encoded_node_string=encoded_node_string)
-    elif len(list(node.children)) == 1:
+    elif len(node.contents) == 1:
+      encoded_node_string = encoded_node_string if encoded_node_string is not None else self.encode_node_string(node_string=node_string)
 
       # The step size will be smaller than the max_chunk_token_size if the max_token_overlap is greater than 0
       step_size = self.max_chunk_token_size - self.max_token_overlap
       for i in range(0, len(encoded_node_string), step_size):
         self.add_string_to_chunk(encoded_node_string=encoded_node_string[i:i + self.max_chunk_token_size])
     else:
-      for child in node.children:
-        self.traverse(node=child)
+      # The children are encoded together in a single batch rather than one at a time as we visit them
+      child_list = list(node.children)
+      child_string_list = [str(child) for child in child_list]
+      encoded_child_string_list = self.encode_node_string_list(node_string_list=child_string_list)
+      for child, child_string, encoded_child_string in zip(child_list, child_string_list, encoded_child_string_list):
+        self.traverse(node=child, node_string=child_string, encoded_node_string=encoded_child_string)
 
 
-  def split_html(self, html: str):
-    soup = BeautifulSoup(html, 'html.parser')
-    self.chunks = []
+  def split_html_encoded(self, html: str) -> List[List[int]]:
+    """
+    Split the html into chunks and return the tokens of each chunk
+    """
+    soup = _unwrap_implied_document_tags(soup=BeautifulSoup(html, 'lxml'), html=html)
+    self.encoded_chunks = []
+    self.encoded_current_chunk = []
 
     self.traverse(node=soup)
     if self.encoded_current_chunk:
-      self.chunks.append(self.encoder.decode(self.encoded_current_chunk))
+      self.encoded_chunks.append(self.encoded_current_chunk)
+
+    return self.encoded_chunks
 
-    return self.chunks
+  def split_html(self, html: str) -> List[str]:
+    """
+    Split the html into chunks and return the text of each chunk
+    """
+    return self.encoder.decode_batch(self.split_html_encoded(html=html), num_threads=os.cpu_count())
 
@@ -17,10 +17,14 @@ RAW_TEXT_ENCODING = "ISO-8859-1"
 ANSI_ESCAPE_8BIT = re.compile(
   br'(?:\x1B[@-Z\\-_]|[\x80-\x9A\x9C-\x9F]|(?:\x1B\[|\x9B)[0-?]*[ -/]*[@-~])'
 )
+# Maps every non-ASCII byte to a space
+ASCII_TRANSLATION_TABLE = bytes([b if b < 128 else ord(" ") for b in range(256)])
+
 def _read_logline(raw_line: str) -> str:
   # 7-bit and 8-bit C1 ANSI sequences
   raw_line = ANSI_ESCAPE_8BIT.sub(b'', raw_line)
-  return "".join([l if ord(l) < 128 else " " for l in raw_line.strip().decode(RAW_TEXT_ENCODING) ])
+  # Every byte is a single character in RAW_TEXT_ENCODING, so replacing the non-ASCII bytes before decoding is equivalent to replacing the non-ASCII characters after
+  return raw_line.strip().translate(ASCII_TRANSLATION_TABLE).decode(RAW_TEXT_ENCODING)
 
 @dataclass
 class DockerResult:
@@ -109,20 +113,31 @@ def run_image_and_wait(
     **kwargs
   ) as container:
     
+    # Build the stop check once rather than looking up the pattern on every log line
+    if stop_regex is None:
+      matches_stop_regex = None
+    elif re.escape(stop_regex) == stop_regex:
+      # The regex is a literal string, so matching it is equivalent to a prefix check
+      matches_stop_regex = lambda log_line: log_line.startswith(stop_regex)
+    else:
+      stop_pattern = re.compile(stop_regex)
+      matches_stop_regex = lambda log_line: stop_pattern.match(log_line) is not None
+
     print("Streaming Logs...")
-    logs = ""
+    log_line_list = []
     for line in container.logs(stream=True):
       log_line = _read_logline(raw_line=line)
       print(log_line)
-      logs += log_line + "\n"
+      log_line_list.append(log_line + "\n")
 
-      if stop_regex is not None and re.match(stop_regex, log_line):
+      if matches_stop_regex is not None and matches_stop_regex(log_line):
         print(f"MATCHED STOP REGEX {stop_regex}")
         container.kill()
         break
 
     print("Waiting...")
     wait_result = container.wait()
+    logs = "".join(log_line_list)
 
   return DockerResult(
     error_status=wait_result['StatusCode'],
@@ -1,18 +1,42 @@
+import asyncio
+from contextlib import AsyncExitStack
+import gzip
+import io
 import logging
 import os
 from typing import Any, List, Optional
 import uuid
 import aioboto3 
+from boto3.s3.transfer import TransferConfig
 from typing import List
 from urllib.parse import urlparse
 import aiofiles
 
 
 AWS_REGION_NAME = "us-east-1"
+GZIP_EXTENSION = ".gz"
+GZIP_COMPRESS_LEVEL = 1
+# Bodies larger than this are uploaded in parts over several concurrent connections rather than in a single put_object call
+MULTIPART_THRESHOLD = 8 * 1024 * 1024
+MULTIPART_MAX_CONCURRENCY = 8
+
+logger = logging.getLogger(__name__)
 
 
 
 class AsyncFileClient:
+  async def __aenter__(self) -> "AsyncFileClient":
+    return self
+
+  async def __aexit__(self, exc_type, exc_value, traceback):
+    await self.close()
+
+  async def close(self):
+    """
+    Release any connections held by the client
+    """
+    pass
+
   async def load_string(self, path: str) -> str:
     raise NotImplementedError("load_string not implemented for AsyncFileClient")
   
@@ -73,14 +97,48 @@ class AsyncS3Client(AsyncFileClient):
     self.buffer_length = buffer_length
     self.s3_buffer = {}
 
+    # The s3 client is created lazily by _get_s3_client and shared across calls until close is called
+    self._s3_client = None
+    self._s3_client_exit_stack = None
+    self._s3_client_loop = None
+    self._s3_client_lock = None
+
+  async def _get_s3_client(self):
+    """
+    Return the shared s3 client, creating it on first use. Reusing the client avoids constructing a new botocore client and TLS session on every call
+    """
+    loop = asyncio.get_running_loop()
+    if self._s3_client_lock is None:
+      self._s3_client_lock = asyncio.Lock()
+      self._s3_client_loop = loop
+    elif self._s3_client_loop is not loop:
+      # NOTE: aiohttp sessions are bound to the event loop that created them, so the client cannot be used from another loop
+      raise RuntimeError("AsyncS3Client must be used and closed on a single event loop. Call close before using it from another loop")
+
+    # The lock guarantees that concurrent callers share a single client
+    async with self._s3_client_lock:
+      if self._s3_client is None:
+        exit_stack = AsyncExitStack()
+        self._s3_client = await exit_stack.enter_async_context(self.session.client('s3'))
+        self._s3_client_exit_stack = exit_stack
+    return self._s3_client
+
+  async def close(self):
+    """
+    Close the shared s3 client. The next call creates a new one
+    """
+    if self._s3_client_exit_stack is not None:
+      await self._s3_client_exit_stack.aclose()
+    self._s3_client, self._s3_client_exit_stack, self._s3_client_loop, self._s3_client_lock = None, None, None, None
+
   async def create_bucket_if_not_exists(self, s3_bucket_name: str):
-    async with self.session.client('s3') as s3_client:
-      # Check whether the bucket exists and create it if it does not
-      try:
-        await s3_client.head_bucket(Bucket=s3_bucket_name)
-      except Exception as e:
-        logging.error(f"S3 Bucket {s3_bucket_name} not found! Creating the bucket.")
-        await s3_client.create_bucket(Bucket=s3_bucket_name)
+    s3_client = await self._get_s3_client()
+    # Check whether the bucket exists and create it if it does not
+    try:
+      await s3_client.head_bucket(Bucket=s3_bucket_name)
+    except Exception as e:
+      logger.error("S3 Bucket %s not found! Creating the bucket.", s3_bucket_name)
+      await s3_client.create_bucket(Bucket=s3_bucket_name)
 
   async def load_string(self, s3_path: str) -> str:
     """
@@ -99,9 +157,9 @@ class AsyncS3Client(AsyncFileClient):
       s3_bucket_name = url_parts.netloc
       key = url_parts.path.lstrip('/')
 
-      async with self.session.client('s3') as s3:
-        response = await s3.get_object(Bucket=s3_bucket_name, Key=key)
-        raw = await response['Body'].read()
+      s3_client = await self._get_s3_client()
+      response = await s3_client.get_object(Bucket=s3_bucket_name, Key=key)
+      raw = await response['Body'].read()
     else:
       # Load from local
       async with aiofiles.open(s3_path, mode='rb') as f:
@@ -121,31 +179,44 @@ class AsyncS3Client(AsyncFileClient):
       if run_create_bucket_if_not_exists:
         await self.create_bucket_if_not_exists(s3_bucket_name=s3_bucket_name)
 
-      async with self.session.client('s3') as s3_client:
-        await s3_client.put_object(Body=obj, Bucket=s3_bucket_name, Key=key)
+      s3_client = await self._get_s3_client()
+      await s3_client.put_object(Body=obj, Bucket=s3_bucket_name, Key=key)
     else:
       # Write to local
       async with aiofiles.open(s3_path, mode='wb') as f:
         await f.write(obj)
 
-  async def load_string_list_from_s3(self, s3_path: str) -> List[str]:
+  async def load_string_list_from_s3(self, s3_path: str, max_concurrency: int = 32) -> List[str]:
     url_parts = urlparse(s3_path)
     bucket_name = url_parts.netloc
     prefix = url_parts.path.lstrip('/')
 
-    async with self.session.resource('s3') as s3:
-      bucket = await s3.Bucket(bucket_name)
-      data = []
+    s3_client = await self._get_s3_client()
+    key_list = [
+      obj['Key']
+      async for page in s3_client.get_paginator('list_objects_v2').paginate(Bucket=bucket_name, Prefix=prefix)
+      for obj in page.get('Contents', [])
+    ]
+
+    # We fetch the objects concurrently, with a semaphore to bound the number of open requests
+    semaphore = asyncio.Semaphore(max_concurrency)
+    async def _load_lines(key: str) -> List[bytes]:
+      async with semaphore:
+        response = await s3_client.get_object(Bucket=bucket_name, Key=key)
+        raw = await response['Body'].read()
+      if key.endswith(GZIP_EXTENSION):
+        # Files written by write_string_list_to_s3 with compress=True are gzip compressed
+        raw = gzip.decompress(raw)
+      return raw.splitlines()
 
-      async for obj in bucket.objects.filter(Prefix=prefix):
-        lines = await (await obj.get())['Body'].readlines()
-        data += [l.decode('utf-8') for l in lines]
+    # asyncio.gather preserves the order of key_list
+    lines_list = await asyncio.gather(*[_load_lines(key) for key in key_list])
 
-    return data
+    return [l.decode('utf-8') for lines in lines_list for l in lines]
 
-  async def write_string_list_to_s3(self, string_list: List[str], s3_directory_path: str, run_create_bucket_if_not_exists: bool = False):
+  async def write_string_list_to_s3(self, string_list: List[str], s3_directory_path: str, run_create_bucket_if_not_exists: bool = False, compress: bool = False):
     """
-    Given a list of strings, write them to a new file in the s3_directory_path
+    Given a list of strings, write them to a new file in the s3_directory_path. If compress is True the file is gzip compressed and its key ends with .gz. load_string_list_from_s3 reads both forms
     """
     print(f"Writing string list of length {len(string_list)} to s3 directory path: {s3_directory_path}")
     url_parts = urlparse(s3_directory_path)
@@ -155,9 +226,34 @@ class AsyncS3Client(AsyncFileClient):
     if run_create_bucket_if_not_exists:
       await self.create_bucket_if_not_exists(s3_bucket_name=s3_bucket_name)
 
-    body = "\n".join(string_list) + "\n"
-    async with self.session.client('s3') as s3_client:
-      await s3_client.put_object(Body=body, Bucket=s3_bucket_name, Key=key)
+    body = ("\n".join(string_list) + "\n").encode("utf-8")
+    if compress:
+      # URL and log lists are highly redundant, so even the fastest compression level shrinks them several times over
+      await self.put_bytes(
+        body=gzip.compress(body, compresslevel=GZIP_COMPRESS_LEVEL),
+        s3_bucket_name=s3_bucket_name,
+        key=key + GZIP_EXTENSION,
+        content_type="application/gzip"
+      )
+    else:
+      await self.put_bytes(body=body, s3_bucket_name=s3_bucket_name, key=key)
+
+  async def put_bytes(self, body: bytes, s3_bucket_name: str, key: str, content_type: Optional[str] = None):
+    """
+    Write body to s3. Large bodies are sent as a multipart upload with the parts uploaded concurrently, and small bodies are sent with a single put_object call
+    """
+    s3_client = await self._get_s3_client()
+    extra_args = {} if content_type is None else {"ContentType": content_type}
+    if len(body) > MULTIPART_THRESHOLD:
+      await s3_client.upload_fileobj(
+        io.BytesIO(body),
+        s3_bucket_name,
+        key,
+        ExtraArgs=extra_args,
+        Config=TransferConfig(multipart_threshold=MULTIPART_THRESHOLD, max_concurrency=MULTIPART_MAX_CONCURRENCY)
+      )
+    else:
+      await s3_client.put_object(Body=body, Bucket=s3_bucket_name, Key=key, **extra_args)
 
   async def write_buffer_to_s3(self, s3_directory_path: str):
     """
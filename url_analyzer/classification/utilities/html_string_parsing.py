@@ -7,27 +7,29 @@ from bs4 import BeautifulSoup
 import re
 
 STRING_REGEX = r'"([^"]*)"|\'([^\']*)\''
+STRING_PATTERN = re.compile(STRING_REGEX)
 TAG_LIST = ['p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'a', 'li', 'span', 'strong', 'em', 'u', 's', 'div']
+TAG_SET = frozenset(TAG_LIST)
 
 def extract_html_content_strings(html_page: str) -> Set[str]:
   # Create a BeautifulSoup object and specify the parser
-  soup = BeautifulSoup(html_page, 'html.parser')
+  soup = BeautifulSoup(html_page, 'lxml')
 
-  # Find all tags that could contain strings, and extract their string content
+  # In a single pass over the tree, extract the string content of the tags that could contain strings along with all id and class attribute values
   strings = []
-  for tag in TAG_LIST:
-    elements = soup.find_all(tag)
-    for element in elements:
-      if element.string:
-        strings.append(element.string)
-
-  # Extract all id and class attribute values
-  ids = [element.get('id') for element in soup.find_all(id=True)]
-  classes = [element.get('class') for element in soup.find_all(class_=True)]
-
-  # Remove None values and flatten the list of classes
-  ids = [i for i in ids if i]
-  classes = [item for sublist in classes for item in sublist if item]
+  ids = []
+  classes = []
+  for element in soup.find_all(True):
+    if element.name in TAG_SET and element.string:
+      strings.append(element.string)
+
+    # Skip None values and flatten the list of classes
+    element_id = element.attrs.get('id')
+    if element_id:
+      ids.append(element_id)
+    element_classes = element.attrs.get('class')
+    if element_classes:
+      classes += [item for item in element_classes if item]
 
   # Combine all strings, ids, and classes into one list
   all_strings = strings + ids + classes
@@ -35,9 +37,8 @@ def extract_html_content_strings(html_page: str) -> Set[str]:
   return set([s.strip() for s in all_strings])
 
 def extract_quoted_strings(html_string: str) -> Set[str]:
-  quoted_string_tuples = re.findall(STRING_REGEX, html_string)
-  all_strings = [''.join(quote) for quote in quoted_string_tuples]
-  return set([s.strip() for s in all_strings])
+  # Exactly one of the two groups participates in each match, and lastindex points to it
+  return {match.group(match.lastindex).strip() for match in STRING_PATTERN.finditer(html_string)}
                                   
 def extract_strings(html_string: str) -> Set[str]:
   return set(extract_quoted_strings(html_string)).union(set(extract_html_content_strings(html_string)))
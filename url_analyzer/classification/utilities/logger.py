@@ -2,8 +2,8 @@ import os
 import sys
 import time
 import uuid
-from pydantic import BaseModel, ConfigDict, ValidationError
-from typing import Any, Awaitable, Callable, Coroutine, Dict, Generic, List, Optional, OrderedDict, Set, Tuple, TypeVar
+from pydantic import BaseModel, ConfigDict, PrivateAttr, ValidationError
+from typing import IO, Any, Awaitable, Callable, Coroutine, Dict, Generic, List, Optional, OrderedDict, Set, Tuple, TypeVar
 from dataclasses import dataclass
 
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
@@ -22,14 +22,16 @@ class Logger(BaseModel):
   dirname: Optional[str] = None
   initial_content: Optional[str] = None
 
+  # We keep the log file open across calls to log rather than opening and closing it on every message, but flush after every write so the log is complete if the process dies
+  _log_file: Optional[IO[str]] = PrivateAttr(default=None)
+
   @classmethod
   async def construct(cls, dirname: Optional[str] = None, key: Optional[str] = None, initial_content: Optional[str] = None) -> "Logger":
     await run_with_logs("mkdir", "-p", dirname, process_name="mkdir")
+    logger = cls(key=key, dirname=dirname, initial_content=initial_content)
     if dirname is not None:
-      fname = os.path.join(dirname, "log.txt")
-      with open(fname, "a") as f:
-        f.write("" if initial_content is None else initial_content)
-    return cls(key=key, dirname=dirname, initial_content=initial_content)
+      logger._write("" if initial_content is None else initial_content)
+    return logger
 
   @classmethod
   async def construct_from_url_and_base_log_dir(cls, url: str, base_log_dir: Optional[str] = None, **kwargs) -> "Logger":
@@ -39,9 +41,31 @@ class Logger(BaseModel):
     dirname = os.path.join(base_log_dir, f"{str(int(time.time()))}_{url_to_filepath(url)}_{uuid.uuid4()}")
     return await cls.construct(dirname=dirname, **kwargs)
 
+  def _get_log_file(self) -> IO[str]:
+    if self._log_file is None or self._log_file.closed:
+      self._log_file = open(os.path.join(self.dirname, "log.txt"), "a")
+    return self._log_file
+
+  def _write(self, msg: str):
+    log_file = self._get_log_file()
+    log_file.write(msg)
+    log_file.flush()
+
   def log(self, msg: str):
     print(msg if self.key is None else f"[{self.key}]" + msg)
     if self.dirname is not None:
-      fname = os.path.join(self.dirname, "log.txt")
-      with open(fname, "a") as f:
-        f.write(msg)
\ No newline at end of file
+      self._write(msg)
+
+  def flush(self):
+    if self._log_file is not None:
+      self._log_file.flush()
+
+  def close(self):
+    if self._log_file is not None:
+      self._log_file.close()
+      self._log_file = None
+
+  def __del__(self):
+    # NOTE: The private attributes do not exist if validation failed in __init__
+    if getattr(self, "__pydantic_private__", None) is not None:
+      self.close()
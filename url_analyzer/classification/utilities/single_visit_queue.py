@@ -1,9 +1,11 @@
-import uuid
+import bisect
+import heapq
+import itertools
+import os
 from pydantic import BaseModel, ConfigDict, ValidationError
-from typing import Any, Awaitable, Callable, Coroutine, Dict, Generic, List, Optional, OrderedDict, Set, Tuple, TypeVar
-from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Coroutine, Dict, Generic, Iterator, List, Optional, OrderedDict, Set, Tuple, TypeVar
+from dataclasses import dataclass, field
 
-import pygtrie
 
 
 
@@ -55,7 +57,12 @@ class SingleVisitQueue(Generic[T]):
 @dataclass
 class PrefixOptimizedSingleVisitQueue(SingleVisitQueue[str]):
   # NOTE: This needs to have a default because of the way that dataclass works
-  trie: pygtrie.StringTrie
+  # Every string that has been popped, in sorted order. The strings that share a prefix form a contiguous range of this list, so we can answer prefix queries with a binary search
+  popped_string_list: List[str]
+
+  # A heap of (priority, insertion count, value) for every value in the queue. The priority stored with a value may be out of date, but since popped_string_list only ever grows the true priority can only be larger than the stored one
+  heap: List[Tuple[int, int, str]] = field(default_factory=list)
+  insertion_counter: Iterator[int] = field(default_factory=itertools.count)
 
   @classmethod
   def construct(cls, name: str):
@@ -63,18 +70,55 @@ class PrefixOptimizedSingleVisitQueue(SingleVisitQueue[str]):
       queue=set(),
       has_ever_been_enqueued=set(),
       name=name,
-      trie=pygtrie.StringTrie()
+      popped_string_list=[]
     )
 
   def prioritization_fn(self, string: str) -> int:
-    longest_prefix = self.trie.longest_prefix(string)[0]
-    return 0 if longest_prefix is None else len(longest_prefix)
+    """
+    Return the length of the longest prefix of string that ends at a "/" separator (or at the end of string) and that is a strict prefix of a string that has already been popped
+    """
+    # The popped string that shares the longest common prefix with string is one of its neighbors in sorted order
+    index = bisect.bisect_left(self.popped_string_list, string)
+    neighbor_list = self.popped_string_list[max(0, index - 1):index + 1]
+    if len(neighbor_list) == 0:
+      return 0
+    common_prefix_length = max(len(os.path.commonprefix([string, neighbor])) for neighbor in neighbor_list)
+
+    # Every prefix shorter than common_prefix_length is a strict prefix of a popped string. The common prefix itself is only a strict prefix if some popped string other than the prefix itself starts with it
+    common_prefix = string[:common_prefix_length]
+    prefix_index = bisect.bisect_left(self.popped_string_list, common_prefix)
+    if self.popped_string_list[prefix_index] == common_prefix and not (
+      prefix_index + 1 < len(self.popped_string_list) and self.popped_string_list[prefix_index + 1].startswith(common_prefix)
+    ):
+      common_prefix_length -= 1
+
+    if common_prefix_length < 0:
+      longest_prefix_length = 0
+    elif common_prefix_length == len(string):
+      longest_prefix_length = common_prefix_length
+    else:
+      # The longest prefix must end just before a "/" separator
+      longest_prefix_length = max(0, string.rfind("/", 0, common_prefix_length + 1))
+    return longest_prefix_length
+
+  def add_to_queue(self, value: str, verbose: bool = False) -> bool:
+    was_added = super().add_to_queue(value=value, verbose=verbose)
+    if was_added:
+      heapq.heappush(self.heap, (self.prioritization_fn(value), next(self.insertion_counter), value))
+    return was_added
 
   def pop_from_queue(self) -> T:
-    # We pop the string that shares the shortest prefix with any string that has already been popped
-    value = super().pop_from_queue(prioritization_fn=self.prioritization_fn)
-    for i in range(len(value)):
-      self.trie[value[:i]] = value
+    # We pop the string that shares the shortest prefix with any string that has already been popped. Rather than scanning the whole queue, we lazily refresh the priority at the top of the heap until it is up to date, at which point it is smaller than or equal to the true priority of every other value
+    while True:
+      priority, insertion_count, value = heapq.heappop(self.heap)
+      current_priority = self.prioritization_fn(value)
+      if current_priority == priority:
+        break
+      heapq.heappush(self.heap, (current_priority, insertion_count, value))
+    self.queue.remove(value)
+    assert value in self.has_ever_been_enqueued
+
+    bisect.insort(self.popped_string_list, value)
     return value
 
 
@@ -102,7 +146,10 @@ T = TypeVar("T")
 def sort_by_string(item_list: Set[T], fn: Optional[Callable[[T], str]] = None) -> List[T]:
   # sort the items in item_set based on the _get_string_ordering_indices of the result of fn
   if fn is None:
-    # We add a random string after each one to guarantee that no two strings are equal. We need to add in the / because the trie uses this as a separator
-    fn = lambda x: str(x) + "/" + str(uuid.uuid4())
-  ordering_indices = _get_string_ordering_indices(string_list=[fn(item) for item in item_list])
+    # We add the item's index after each one to guarantee that no two strings are equal. We need to add in the / because the prioritization uses this as a separator, and we zero-pad the index so that no suffix is a prefix of another
+    index_width = len(str(len(item_list)))
+    string_list = [f"{item}/{index:0{index_width}d}" for index, item in enumerate(item_list)]
+  else:
+    string_list = [fn(item) for item in item_list]
+  ordering_indices = _get_string_ordering_indices(string_list=string_list)
   return [item_list[index] for index in ordering_indices]
\ No newline at end of file
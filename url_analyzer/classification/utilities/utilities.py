@@ -1,27 +1,28 @@
 import asyncio
+import collections
+import functools
+import itertools
 import json
 import logging
 import os
 import re
+import socket
 import subprocess
 import time
-import traceback
 import uuid
-import aiohttp
-import chardet
 import httpx
-import numpy as np
-from pydantic import BaseModel, ConfigDict, ValidationError
+import orjson
+from pydantic import BaseModel
 import urllib.parse
-import requests
 import tldextract
 from typing import Any, Awaitable, Callable, Coroutine, Dict, Generic, List, Optional, OrderedDict, Set, Tuple, TypeVar
 from dataclasses import dataclass
-from diff_match_patch import diff_match_patch
 import yaml
 import string
 
 
+logger = logging.getLogger(__name__)
+
 class BaseModelWithWrite(BaseModel):
   def write_to_file(self, filepath: str) -> str:
     object_json = self.model_dump_json(indent=2)
@@ -78,7 +79,7 @@ async def async_maybe_monad_join(maybe: Maybe[T], fn: Callable[[T1, Any], Maybe[
 
 async def chunked_gather(awaitable_list: List[Awaitable], chunk_size: int = 100, verbose: bool = False, use_subchunking_for_first_iteration: bool = False) -> List[Any]:
   """
-  Given a list of awaitables, gather them in chunks of 1000 to avoid overloading the event loop.
+  Given a list of awaitables, run them with at most chunk_size running at a time to avoid overloading the event loop. A new awaitable starts as soon as any running one finishes, rather than waiting for the whole chunk to finish. The results are returned in the order of awaitable_list
   """
   start = time.time()
   gathered_list = []
@@ -97,10 +98,35 @@ async def chunked_gather(awaitable_list: List[Awaitable], chunk_size: int = 100,
       start_index = chunk_size
     else:
       start_index = 0
-    for i in range(start_index, len(awaitable_list), chunk_size):
-      if verbose:
-        print(f"Batch {i}:{min(len(awaitable_list), i+chunk_size)} out of {len(awaitable_list)} [{int(time.time() - start)} seconds]")
-      gathered_list += await asyncio.gather(*awaitable_list[i:i+chunk_size])
+
+    completed_count = start_index
+    result_list = [None] * (len(awaitable_list) - start_index)
+    # islice avoids copying the remainder of awaitable_list. The workers share the iterator, so each one pulls the next awaitable as soon as it finishes its last one
+    index_and_awaitable_iterator = enumerate(itertools.islice(awaitable_list, start_index, None))
+    async def run_worker():
+      nonlocal completed_count
+      for i, awaitable in index_and_awaitable_iterator:
+        result_list[i] = await awaitable
+        completed_count += 1
+        if verbose and completed_count % chunk_size == 0:
+          print(f"Completed {completed_count} out of {len(awaitable_list)} [{int(time.time() - start)} seconds]")
+
+    # Only chunk_size tasks exist at any time, no matter how long awaitable_list is. The TaskGroup cancels the other workers as soon as one of them fails
+    try:
+      async with asyncio.TaskGroup() as task_group:
+        for _ in range(min(chunk_size, len(result_list))):
+          task_group.create_task(run_worker())
+    except BaseExceptionGroup as e:
+      # Raise the first failure itself, as asyncio.gather does, so that callers can catch it by type. The other failures are logged and kept on the raised exception's __cause__
+      for other_exception in e.exceptions[1:]:
+        logger.error("chunked_gather: additional failure: %r", other_exception)
+      raise e.exceptions[0] from e
+    finally:
+      # Close the coroutines that were never started after a failure, so that they do not warn that they were never awaited
+      for _, awaitable in index_and_awaitable_iterator:
+        if asyncio.iscoroutine(awaitable):
+          awaitable.close()
+    gathered_list += result_list
   return gathered_list
 
 
@@ -128,27 +154,48 @@ def zip_with_exception(l1: List[Any], l2: List[Any]) -> List[Tuple[Any, Any]]:
   return list(zip(l1, l2))
 
 
-def memoize(func):
+# Separates the positional arguments from the keyword arguments in memoize keys, so that f(1, ("a", 2)) and f(1, a=2) do not collide
+_MEMOIZE_KWARGS_MARK = object()
+
+def memoize(func: Optional[Callable] = None, maxsize: Optional[int] = None):
   """
+  Memoize a sync or async function. By default every result is kept. With @memoize(maxsize=...) at most maxsize results are kept and the least recently used ones are evicted first
+
   (c) 2021 Nathan Henrie, MIT License
   https://n8henrie.com/2021/11/decorator-to-memoize-sync-or-async-functions-in-python/
   """
-  cache = {}
+  if func is None:
+    return functools.partial(memoize, maxsize=maxsize)
+
+  cache = collections.OrderedDict()
 
+  def get_key(args: Tuple[Any, ...], kwargs: Dict[str, Any]) -> Tuple[Any, ...]:
+    # kwargs preserves the order in which the keyword arguments were passed, so we skip sorting them. The same call with its keyword arguments in a different order is still correct, it just gets its own cache entry
+    return args if len(kwargs) == 0 else args + (_MEMOIZE_KWARGS_MARK,) + tuple(kwargs.items())
+
+  def add_to_cache(key: Tuple[Any, ...], result: Any):
+    cache[key] = result
+    if maxsize is not None and len(cache) > maxsize:
+      cache.popitem(last=False)
+
+  @functools.wraps(func)
   async def memoized_async_func(*args, **kwargs):
-    key = (args, frozenset(sorted(kwargs.items())))
+    key = get_key(args=args, kwargs=kwargs)
     if key in cache:
+      cache.move_to_end(key)
       return cache[key]
     result = await func(*args, **kwargs)
-    cache[key] = result
+    add_to_cache(key=key, result=result)
     return result
 
+  @functools.wraps(func)
   def memoized_sync_func(*args, **kwargs):
-    key = (args, frozenset(sorted(kwargs.items())))
+    key = get_key(args=args, kwargs=kwargs)
     if key in cache:
+      cache.move_to_end(key)
       return cache[key]
     result = func(*args, **kwargs)
-    cache[key] = result
+    add_to_cache(key=key, result=result)
     return result
 
   if asyncio.iscoroutinefunction(func):
@@ -158,19 +205,28 @@ def memoize(func):
 
 
 
+# Crawls revisit the same urls and hosts many times, so we cache the results of the suffix list lookups
+TLD_EXTRACT_CACHE_SIZE = 200000
+
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
 def get_rdn_from_url(url: str) -> str:
   tld_extract_result = tldextract.extract(url)
   return tld_extract_result.registered_domain
 
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
 def get_fqdn_from_url(url: str) -> str:
   tld_extract_result = tldextract.extract(url)
   return '.'.join([r for r in [tld_extract_result.subdomain, tld_extract_result.domain, tld_extract_result.suffix] if len(r) > 0])
 
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
 def get_rdn_from_fqdn(fqdn: str) -> str:
   return get_rdn_from_url("http://" + fqdn)
 
 
 def get_url_from_domain(domain: str) -> str:
+  # requests is only needed here, so we import it lazily to keep it out of the import time of this module
+  import requests
+
   # Try making an http call, and see if it redirects to https
   try:
     r = requests.get(f'https://{domain}')
@@ -181,14 +237,18 @@ def get_url_from_domain(domain: str) -> str:
   return f'http://{domain}'
   
 
+# The libyaml backed loader and dumper are much faster than the pure python ones, but they only exist if PyYAML was built with libyaml
+YAML_SAFE_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+YAML_DUMPER = getattr(yaml, "CDumper", yaml.Dumper)
+
 def read_yaml_file(file_path: str) -> Dict[str, Any]:
   with open(file_path, 'r') as file:
-    data = yaml.safe_load(file)
+    data = yaml.load(file, Loader=YAML_SAFE_LOADER)
   return data
 
 def write_yaml_file(data: Dict[str, Any], file_path: str):
   with open(file_path, 'w') as file:
-    yaml.dump(data, file)
+    yaml.dump(data, file, Dumper=YAML_DUMPER)
 
 async def run_with_logs(*args, process_name: str):
   args_string = " ".join(args)
@@ -209,32 +269,39 @@ def load_pydantic_model_from_file_path(path: str, cls: T) -> T:
 
 T = TypeVar("T")
 def load_pydantic_model_from_directory_path(path: str, cls: T) -> List[T]:
-  fname_list = os.listdir(path)
-  print(f"Loading {len(fname_list)} files from path: {path}")
+  with os.scandir(path) as entry_iterator:
+    entry_list = list(entry_iterator)
+  print(f"Loading {len(entry_list)} files from path: {path}")
 
   visited_url_list = []
-  for fname in fname_list:
-    # Subdirectories should not be loaded
-    fpath = os.path.join(path, fname)
-    if os.path.isfile(fpath) and fname.endswith(".json"):
-      with open(fpath, "r") as f:
+  for entry in entry_list:
+    # Subdirectories should not be loaded. The file type comes from the directory listing, so this does not stat each file
+    if entry.is_file() and entry.name.endswith(".json"):
+      # model_validate_json accepts bytes, so we skip decoding the file
+      with open(entry.path, "rb") as f:
         try:
           visited_url_list.append(cls.model_validate_json(f.read()))
         except Exception as e:
-          print(f"ERROR on fpath: {fpath}")
+          print(f"ERROR on fpath: {entry.path}")
           raise e
     else:
-      print(f"Skipping {fpath} because it is not a file or does not end with .json")
+      print(f"Skipping {entry.path} because it is not a file or does not end with .json")
   return visited_url_list
 
 
+@functools.lru_cache(maxsize=100000)
+def urlparse_cached(url: str) -> urllib.parse.ParseResult:
+  # ParseResult is an immutable namedtuple, so it is safe to share parses of the same url. The standard library only caches the last 128 urlsplit calls
+  return urllib.parse.urlparse(url)
+
+
 def modify_url(url: str, base_url: Optional[str] = None, url_parameters: Optional[Dict[str, Any]] = None) -> str:
   # Parse the original URL
-  parsed_url = urllib.parse.urlparse(url)
+  parsed_url = urlparse_cached(url)
   
   # If base_url is provided, parse it and use its scheme, netloc, and path
   if base_url is not None:
-    parsed_base = urllib.parse.urlparse(base_url)
+    parsed_base = urlparse_cached(base_url)
     scheme, netloc, path = parsed_base.scheme, parsed_base.netloc, parsed_base.path
   else:
     scheme, netloc, path = parsed_url.scheme, parsed_url.netloc, parsed_url.path
@@ -255,6 +322,74 @@ def modify_url(url: str, base_url: Optional[str] = None, url_parameters: Optiona
   return new_url
 
 
+def compile_regex_list(regex_list: Optional[List[str]]) -> Tuple[re.Pattern, ...]:
+  """
+  Compile each regex in the list on its own
+  """
+  # NOTE: The regexes are not merged into one alternation, since inline flags like (?i), backreferences and repeated group names only work in a pattern of their own
+  return () if regex_list is None else tuple(re.compile(regex) for regex in regex_list)
+
+
+@dataclass(frozen=True)
+class UrlFilter:
+  """
+  The compiled form of the regexes accepted by filter_url
+  """
+  included_fqdn_pattern: Optional[re.Pattern] = None
+  excluded_fqdn_pattern_tuple: Tuple[re.Pattern, ...] = ()
+  included_url_pattern: Optional[re.Pattern] = None
+  excluded_url_pattern_tuple: Tuple[re.Pattern, ...] = ()
+
+  @classmethod
+  def construct(
+    cls,
+    included_fqdn_regex: Optional[str] = None,
+    excluded_fqdn_regex_list: Optional[List[str]] = None,
+    included_url_regex: Optional[str] = None,
+    excluded_url_regex_list: Optional[List[str]]  = None
+  ) -> "UrlFilter":
+    return _construct_url_filter(
+      included_fqdn_regex=included_fqdn_regex,
+      excluded_fqdn_regex_tuple=safe_apply(excluded_fqdn_regex_list, tuple),
+      included_url_regex=included_url_regex,
+      excluded_url_regex_tuple=safe_apply(excluded_url_regex_list, tuple)
+    )
+
+  def matches(self, url: str) -> bool:
+    """
+    Return True if the url matches the filter
+    """
+    # The fqdn is only extracted if one of the patterns needs it
+    fqdn = get_fqdn_from_url(url) if self.included_fqdn_pattern is not None or len(self.excluded_fqdn_pattern_tuple) > 0 else None
+
+    included = True
+    if included and self.included_fqdn_pattern is not None:
+      included = self.included_fqdn_pattern.fullmatch(fqdn) is not None
+    if included and self.included_url_pattern is not None:
+      included = self.included_url_pattern.fullmatch(url) is not None
+    if included and len(self.excluded_fqdn_pattern_tuple) > 0:
+      included = not any(pattern.fullmatch(fqdn) is not None for pattern in self.excluded_fqdn_pattern_tuple)
+    if included and len(self.excluded_url_pattern_tuple) > 0:
+      included = not any(pattern.fullmatch(url) is not None for pattern in self.excluded_url_pattern_tuple)
+    return included
+
+
+@functools.lru_cache(maxsize=1024)
+def _construct_url_filter(
+  included_fqdn_regex: Optional[str],
+  excluded_fqdn_regex_tuple: Optional[Tuple[str, ...]],
+  included_url_regex: Optional[str],
+  excluded_url_regex_tuple: Optional[Tuple[str, ...]]
+) -> UrlFilter:
+  # filter_url is called once per url with the same regexes, so we only compile them once
+  return UrlFilter(
+    included_fqdn_pattern=safe_apply(included_fqdn_regex, re.compile),
+    excluded_fqdn_pattern_tuple=compile_regex_list(excluded_fqdn_regex_tuple),
+    included_url_pattern=safe_apply(included_url_regex, re.compile),
+    excluded_url_pattern_tuple=compile_regex_list(excluded_url_regex_tuple)
+  )
+
+
 def filter_url(
   url: str,
   included_fqdn_regex: Optional[str] = None,
@@ -266,21 +401,19 @@ def filter_url(
   Return True if the url matches the filter
   """
 
-  print(f"filter_url called with url: {url} included_fqdn_regex: {included_fqdn_regex} excluded_fqdn_regex_list: {excluded_fqdn_regex_list} included_url_regex: {included_url_regex} excluded_url_regex_list: {excluded_url_regex_list}")
+  # This runs once per url, so the arguments are only formatted when debug logging is enabled
+  logger.debug(
+    "filter_url called with url: %s included_fqdn_regex: %s excluded_fqdn_regex_list: %s included_url_regex: %s excluded_url_regex_list: %s",
+    url, included_fqdn_regex, excluded_fqdn_regex_list, included_url_regex, excluded_url_regex_list
+  )
 
-
-  fqdn = get_fqdn_from_url(url)
-
-  included = True
-  if included and included_fqdn_regex is not None:
-    included = re.fullmatch(included_fqdn_regex, fqdn) is not None
-  if included and included_url_regex is not None:
-    included = re.fullmatch(included_url_regex, url) is not None
-  if included and  excluded_fqdn_regex_list is not None and len(excluded_fqdn_regex_list) > 0:
-    included = not any(re.fullmatch(excluded_fqdn_regex, fqdn) is not None for excluded_fqdn_regex in excluded_fqdn_regex_list)
-  if included and excluded_url_regex_list is not None and len(excluded_url_regex_list) > 0:
-    included = not any(re.fullmatch(excluded_url_regex, url) is not None for excluded_url_regex in excluded_url_regex_list)
-  return included
+  url_filter = UrlFilter.construct(
+    included_fqdn_regex=included_fqdn_regex,
+    excluded_fqdn_regex_list=excluded_fqdn_regex_list,
+    included_url_regex=included_url_regex,
+    excluded_url_regex_list=excluded_url_regex_list
+  )
+  return url_filter.matches(url)
 
 
 def filter_url_list(
@@ -290,7 +423,8 @@ def filter_url_list(
   """
   Return the list of urls that match the filter
   """
-  return [url for url in url_list if filter_url(url, **kwargs)]
+  url_filter = UrlFilter.construct(**kwargs)
+  return [url for url in url_list if url_filter.matches(url)]
   
 
 def safe_apply(obj, fn):
@@ -322,24 +456,46 @@ def pydantic_create(cls, **kwargs):
 
 
 def url_to_filepath(url: str) -> str:
-  return url.split("?")[0].replace("/", "_").replace(":", "_")[:100] + str(uuid.uuid4())
+  return url.split("?", 1)[0].replace("/", "_").replace(":", "_")[:100] + str(uuid.uuid4())
 
 def get_base_url_from_url(url: str) -> str:
-  return url.split("?")[0]
+  return url.partition("?")[0]
+
 
+# The characters that a json document can start with, including the NaN and Infinity extensions that json.loads accepts
+JSON_FIRST_CHARACTERS = frozenset('{["tfnNI-0123456789')
 
 def is_json(string: str) -> bool:
+  if isinstance(string, str):
+    stripped_string = string.lstrip(" \t\n\r")
+    if len(stripped_string) == 0 or stripped_string[0] not in JSON_FIRST_CHARACTERS:
+      # Most strings that are not json (e.g. html) are rejected here without raising an exception
+      return False
   try:
-    json.loads(string)
-  except Exception as e:
-    return False
-  else:
-    return True
+    orjson.loads(string)
+  except (orjson.JSONDecodeError, TypeError):
+    # orjson is stricter than json (e.g. it rejects NaN and integers larger than 64 bits), so we only trust its positive answers
+    try:
+      json.loads(string)
+    except Exception as e:
+      return False
+  return True
+
+def is_dns_resolution_error(e: BaseException) -> bool:
+  """
+  Return True if the exception was caused by a failure to resolve a hostname
+  """
+  # httpx wraps the socket error in its own exceptions, so we walk the chain of causes
+  exception = e
+  while exception is not None and not isinstance(exception, socket.gaierror):
+    exception = exception.__cause__ or exception.__context__
+  return exception is not None
+
 
 async def get_response_value_from_domain(
   client: httpx.AsyncClient,
   fqdn: str,
-  fn: Callable[[aiohttp.ClientResponse], T],
+  fn: Callable[[httpx.Response], T],
   method_string: str = "get"
 ) -> Optional[T]:
 
@@ -354,20 +510,32 @@ async def get_response_value_from_domain(
       response = await client_method(f"https://{fqdn}", headers=headers, follow_redirects=True)
       response_value = fn(response)
     except Exception as e:
+      if is_dns_resolution_error(e):
+        # The http request would fail to resolve the same hostname
+        raise e
       # We start with https and fall back to http if it fails
       response = await client_method(f"http://{fqdn}", headers=headers, follow_redirects=True)
       response_value = fn(response)
   except Exception as e:
-    print(f"[get_response_value_from_domain] Exception on domain: {fqdn}: -------START EXCEPTION----------\n{e}\n-------END EXCEPTION-------")
+    logger.debug("[get_response_value_from_domain] Exception on domain: %s: -------START EXCEPTION----------\n%s\n-------END EXCEPTION-------", fqdn, e)
     response_value = None
   return response_value
 
 
 T = TypeVar("T")
-async def get_domain_to_response_value_list(fqdn_list: List[str], fn: Callable[[aiohttp.ClientResponse], T], method_string: str = "get") -> Dict[str, Optional[T]]:
-
-  async with httpx.AsyncClient(verify=False) as client:
-    extracted_value_list = await chunked_gather([get_response_value_from_domain(client=client, fqdn=fqdn, fn=fn, method_string=method_string) for fqdn in fqdn_list])
+async def get_domain_to_response_value_list(
+  fqdn_list: List[str],
+  fn: Callable[[httpx.Response], T],
+  method_string: str = "get",
+  client: Optional[httpx.AsyncClient] = None
+) -> Dict[str, Optional[T]]:
+  """
+  Return the value of fn on the response of each fqdn. Pass a long lived client to reuse its pooled connections across calls, otherwise a client is opened for this call and closed once every fqdn is done
+  """
+  if client is None:
+    async with httpx.AsyncClient(verify=False) as client:
+      return await get_domain_to_response_value_list(fqdn_list=fqdn_list, fn=fn, method_string=method_string, client=client)
+  extracted_value_list = await chunked_gather([get_response_value_from_domain(client=client, fqdn=fqdn, fn=fn, method_string=method_string) for fqdn in fqdn_list])
   return dict(zip(fqdn_list, extracted_value_list))
 
 
@@ -375,46 +543,56 @@ def json_dumps_safe(obj: Any) -> Optional[str]:
   if obj is None:
     return None
   else:
-    return json.dumps(obj, indent=2, sort_keys=True, default=str)
+    try:
+      # orjson is several times faster than json on the large nested message payloads we log
+      return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS, default=str).decode("utf-8")
+    except orjson.JSONEncodeError:
+      # Fall back to json for objects orjson rejects (e.g. integers larger than 64 bits)
+      return json.dumps(obj, indent=2, sort_keys=True, default=str)
   
 
 
 def replace_in_dict(d: Dict[str, Any], to_replace: str, replacement: str) -> Dict[str, Any]:
   """
-  Recursively replace all occurrences of 'to_replace' with 'replacement' in a dictionary.
+  Replace all occurrences of 'to_replace' with 'replacement' in the strings of a dictionary, including the strings in nested dictionaries and lists. The dictionary is modified in place.
   
   :param d: The dictionary to traverse.
   :param to_replace: The string to be replaced.
   :param replacement: The string to replace 'to_replace' with.
   """
-  for key, value in d.items():
-    if isinstance(value, dict):
-      # If the value is a dictionary, recursively apply the function
-      replace_in_dict(d=value, to_replace=to_replace, replacement=replacement)
-    elif isinstance(value, str):
-      # If the value is a string, replace occurrences of 'to_replace'
-      d[key] = value.replace(to_replace, replacement)
-    # If the value is neither a dictionary nor a string, it remains unchanged
+  # We walk the nested containers with a stack rather than recursing
+  container_stack = [d]
+  while len(container_stack) > 0:
+    container = container_stack.pop()
+    for key, value in (container.items() if isinstance(container, dict) else enumerate(container)):
+      if isinstance(value, (dict, list)):
+        container_stack.append(value)
+      elif isinstance(value, str) and to_replace in value:
+        # Strings that do not contain 'to_replace' are left as they are
+        container[key] = value.replace(to_replace, replacement)
+      # If the value is neither a container nor a string, it remains unchanged
   return d
 
 
 def get_single_html_diff_string(starting_html: str, ending_html: str, buffer: int) -> str:
   # Returns the sections of the ending_html that are different from the starting_html
+  from diff_match_patch import diff_match_patch
   dmp = diff_match_patch()
   patches = dmp.patch_make(starting_html=starting_html, ending_html=ending_html)
   diff_list = [ending_html[p.start2 - buffer:p.start2 + p.length2 + buffer] for p in patches]
   return "|".join(diff_list)
 
 
+# The allowed characters are built once at import time, as bytes so that bytes.translate can delete all of them in a single pass
+URL_ALLOWED_BYTES = (string.ascii_letters + string.digits + "-_.~").encode("ascii")
+URL_ENCODING_PATTERN = re.compile(r"%[0-9A-Fa-f]{2}")
+
 def ensure_url_encoded(input_string: str) -> str:
   """
   Given an input string, check if it's already URL encoded. If it's not, encode it.
   """
-  # Try decoding the string
-  decoded_string = str(urllib.parse.unquote(input_string))
-  
-  # If the decoded string is different from the original, it's likely encoded
-  if decoded_string != input_string:
+  # If decoding the string would change it, it's likely encoded. Decoding changes the string if and only if it contains a URL encoding, so we search for one rather than decoding the whole string
+  if "%" in input_string and URL_ENCODING_PATTERN.search(input_string) is not None:
     output_string = input_string # Already encoded, return as is
   else:
     # Not encoded, encode it
@@ -430,18 +608,14 @@ def contains_non_url_encoded_characters(input_string: str) -> bool:
   NOTE: This may be less useful than you thought, since non-standard characters are actually allowed in the query part of a URL. See https://web.archive.org/web/20151229061347/http://blog.lunatech.com/2009/02/03/what-every-web-developer-must-know-about-url-encoding. 
   """
 
-  # Whitelist of characters allowed in a URL
-  # allowed_chars = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~:/?#[]@!$&'()*+,;="
-  allowed_chars = set(list(string.ascii_letters) + list(string.digits) + ['-', '_', '.', '~'])
-
-  # Check if each character in the string is allowed in a URL
-  for i, char in enumerate(input_string):
-    if char not in allowed_chars:
-      # Check if the character is already part of a URL encoding
-      if not re.match(r'%[0-9A-Fa-f]{2}', input_string[i:i+3]):
-        return True  # Requires URL encoding
+  if not input_string.isascii():
+    return True  # Requires URL encoding
 
-  return False  # No encoding required
+  # Delete every allowed character in a single pass. Only % may be left over, and only as the start of a URL encoding
+  disallowed_bytes = input_string.encode("ascii").translate(None, URL_ALLOWED_BYTES)
+  percent_count = disallowed_bytes.count(b"%")
+  # A URL encoding cannot contain another %, so each match of the pattern accounts for exactly one %
+  return percent_count != len(disallowed_bytes) or percent_count != len(URL_ENCODING_PATTERN.findall(input_string))
 
   # is_equal_to_decoded_string = str(urllib.parse.unquote(input_string)) == input_string
   # string_is_not_equal_to_url_decoded_string = str(urllib.parse.unquote(input_string)) != input_string
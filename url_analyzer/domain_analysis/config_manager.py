@@ -1,4 +1,6 @@
+import functools
 import os
+from typing import List
 
 CONFIG_ROOT_PATH = os.path.join(os.path.dirname(__file__), "../../configs")
 WEBHOSTING_DOMAINS_FILE_LOCAL_PATH = os.path.join(CONFIG_ROOT_PATH, "webhosting_domains.txt")
@@ -13,18 +15,24 @@ TOP_DOMAINS_FILE_LOCAL_PATH_DICT = {
 class ConfigManager:
 
   def __init__(self):
-    with open(WEBHOSTING_DOMAINS_FILE_LOCAL_PATH, "r") as f:
-      self.webhosting_domains_set = set([line.strip() for line in f.readlines()])
-
-    count_to_top_domains_set = {}
-    for rank_magnitude, path in TOP_DOMAINS_FILE_LOCAL_PATH_DICT.items():
-      with open(path, "r") as f:
-        count_to_top_domains_set[rank_magnitude] = set([line.strip() for line in f.readlines()])
-    
+    self.webhosting_domains_set = set(read_domain_list(path=WEBHOSTING_DOMAINS_FILE_LOCAL_PATH))
+
     # Map from domain_name to the order of magnitude of its domain rank
     self.domain_to_rank_magnitude = {}
-    for rank_magnitude in DOMAIN_RANK_MAGNITUDES:
-      for domain in count_to_top_domains_set[rank_magnitude]:
+    for rank_magnitude in sorted(DOMAIN_RANK_MAGNITUDES):
+      for domain in read_domain_list(path=TOP_DOMAINS_FILE_LOCAL_PATH_DICT[rank_magnitude]):
         # We iterate through the rank magnitudes from smaller to larger, so we don't overwrite a 10k magnitude with a 100k magnitude
-        if domain not in self.domain_to_rank_magnitude:
-          self.domain_to_rank_magnitude[domain] = rank_magnitude
\ No newline at end of file
+        self.domain_to_rank_magnitude.setdefault(domain, rank_magnitude)
+
+
+def read_domain_list(path: str) -> List[str]:
+  with open(path, "r") as f:
+    return [line.strip() for line in f.read().splitlines()]
+
+
+@functools.lru_cache(maxsize=1)
+def get_config_manager() -> ConfigManager:
+  """
+  Return a ConfigManager that is shared across the process. Loading the domain lists takes a while, so callers that don't need their own copy should use this
+  """
+  return ConfigManager()
@@ -6,7 +6,7 @@ Options
 import dns.resolver
 from typing import Any, Callable, Coroutine, Dict, List, Optional, Set
 from pydantic import BaseModel
-from url_analyzer.domain_analysis.config_manager import ConfigManager
+from url_analyzer.domain_analysis.config_manager import ConfigManager, get_config_manager
 
 def get_parent_domains_of_fqdn(fqdn: str) -> List[str]:
   parts = fqdn.split('.')
@@ -32,20 +32,25 @@ class DomainClassificationResponse(BaseModel):
     fqdn: str,
     config_manager: Optional[ConfigManager] = None
   ) -> "DomainClassification":
-    config_manager = config_manager if config_manager is not None else ConfigManager()
-    parent_domains_list = get_parent_domains_of_fqdn(fqdn=fqdn)
-    
+    config_manager = config_manager if config_manager is not None else get_config_manager()
     domain_rank_magnitude = config_manager.domain_to_rank_magnitude.get(fqdn)  
+    is_webhosting_fqdn = fqdn in config_manager.webhosting_domains_set
+
+    # We check the rank magnitude and webhosting status of every parent domain in a single pass
     best_parent_domain_rank_magnitude = None
-    for parent_domain in parent_domains_list:
+    has_webhosting_domain_parent = False
+    # Each parent domain is the suffix of the fqdn after one of its dots, so we slice it out directly rather than splitting and rejoining the labels
+    parent_domain_start = 0
+    while parent_domain_start >= 0:
+      parent_domain = fqdn[parent_domain_start:]
       parent_domain_rank_magnitude = config_manager.domain_to_rank_magnitude.get(parent_domain)
-      if best_parent_domain_rank_magnitude is None:
-        best_parent_domain_rank_magnitude = parent_domain_rank_magnitude
-      elif parent_domain_rank_magnitude is not None and parent_domain_rank_magnitude < best_parent_domain_rank_magnitude:
+      if parent_domain_rank_magnitude is not None and (best_parent_domain_rank_magnitude is None or parent_domain_rank_magnitude < best_parent_domain_rank_magnitude):
         best_parent_domain_rank_magnitude = parent_domain_rank_magnitude
+      has_webhosting_domain_parent = has_webhosting_domain_parent or parent_domain in config_manager.webhosting_domains_set
+
+      next_dot_index = fqdn.find('.', parent_domain_start)
+      parent_domain_start = next_dot_index + 1 if next_dot_index >= 0 else -1
 
-    is_webhosting_fqdn = fqdn in config_manager.webhosting_domains_set
-    has_webhosting_domain_parent = any([parent_domain in config_manager.webhosting_domains_set for parent_domain in parent_domains_list])
     return cls(
       fqdn=fqdn,
       domain_rank_magnitude=domain_rank_magnitude,
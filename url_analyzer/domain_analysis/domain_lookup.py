@@ -1,20 +1,25 @@
+from collections import OrderedDict
+import concurrent.futures
 from datetime import datetime
 import dns.resolver
+import functools
 import logging
+import random
 import time
-from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, TypeVar, Union
+from typing import Any, Callable, Coroutine, Dict, List, Optional, Set, Tuple, TypeVar, Union
 
 from pydantic import BaseModel
 import asyncwhois
 import whodap
 
-import numpy as np
 import asyncio
 import httpx
 import tldextract
 
 import whois
 
+logger = logging.getLogger(__name__)
+
 
 def safe_to_str(value: Optional[Any]) -> Optional[str]:
   if value is None:
@@ -26,27 +31,60 @@ def safe_to_str(value: Optional[Any]) -> Optional[str]:
       return None
     
 
+def get_retry_after_seconds(e: Exception) -> Optional[float]:
+  """
+  Return the number of seconds in the Retry-After header of the response attached to the exception, if there is one
+  """
+  response = getattr(e, "response", None)
+  retry_after = None if response is None else response.headers.get("Retry-After")
+  try:
+    return None if retry_after is None else float(retry_after)
+  except ValueError:
+    # Retry-After may also be an http date, which we ignore
+    return None
+
+
 async def call_with_rate_limit_retry(
   fn: Callable[[Any], Coroutine],
   exception: Exception,
-  sleep_seconds_min: int = 2,
-  sleep_seconds_max: int = 10,
+  max_retries: int = 4,
+  sleep_seconds_base: float = 1.0,
+  sleep_seconds_cap: float = 30.0,
   **kwargs
 ) -> Any:
-  try:
-    out = await fn(**kwargs)
-  except exception as e:
-    print(f"Exception {str(e)} caught in call_with_rate_limit_retry")
-    sleep_seconds = 2 + (np.random.random() * (sleep_seconds_max - sleep_seconds_min))
-    
-    # NOTE: asyncio.sleep will only cause this async run to sleep, not the whole program
-    await asyncio.sleep(sleep_seconds)
-    out = await fn(**kwargs)
-  return out
+  """
+  Call fn, retrying up to max_retries times when it raises exception. The sleeps between retries follow "decorrelated jitter" backoff (https://aws.amazon.com/blogs/architecture/exponential-backoff-and-jitter/), which spreads out the retries of concurrent callers that were rate limited at the same time
+  """
+  sleep_seconds = sleep_seconds_base
+  retry_count = 0
+  while True:
+    try:
+      return await fn(**kwargs)
+    except exception as e:
+      if retry_count >= max_retries:
+        raise e
+      retry_count += 1
+      sleep_seconds = min(sleep_seconds_cap, random.uniform(sleep_seconds_base, sleep_seconds * 3))
+      retry_after_seconds = get_retry_after_seconds(e)
+      if retry_after_seconds is not None:
+        sleep_seconds = max(sleep_seconds, retry_after_seconds)
+      logger.debug("Exception %s caught in call_with_rate_limit_retry, retry %d of %d in %.1f seconds", e, retry_count, max_retries, sleep_seconds)
+
+      # NOTE: asyncio.sleep will only cause this async run to sleep, not the whole program
+      await asyncio.sleep(sleep_seconds)
+
+
+# The same domains show up over and over in the certstream, so we cache the tldextract parses
+TLD_EXTRACT_CACHE_SIZE = 65536
 
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
+def extract_tld(url: str) -> tldextract.tldextract.ExtractResult:
+  return tldextract.extract(url)
 
+
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
 def get_rdn_from_url(url: str) -> str:
-  tld_extract_result = tldextract.extract(url)
+  tld_extract_result = extract_tld(url)
   return tld_extract_result.registered_domain
 
 
@@ -61,6 +99,15 @@ class DomainLookupField:
   CREATED = "created"
 
 CRITICAL_DOMAIN_LOOKUP_FIELDS = [DomainLookupField.CREATED, DomainLookupField.REGISTRAR_NAME]
+DOMAIN_LOOKUP_FIELDS = (
+  DomainLookupField.REGISTRANT_NAME,
+  DomainLookupField.REGISTRAR_NAME,
+  DomainLookupField.STATUS,
+  DomainLookupField.NAMESERVERS,
+  DomainLookupField.EXPIRES,
+  DomainLookupField.UPDATED,
+  DomainLookupField.CREATED,
+)
 
 
 def _parse_whois_date(date_or_list: Union[str, datetime, List[Union[str, datetime]]]) -> str:
@@ -71,43 +118,130 @@ def _parse_whois_date(date_or_list: Union[str, datetime, List[Union[str, datetim
   return date.isoformat() if hasattr(date, 'isoformat') else str(date)
 
 
+def _parse_optional_whois_date(date_or_list: Optional[Union[str, datetime, List[Union[str, datetime]]]]) -> Optional[str]:
+  return None if date_or_list is None else _parse_whois_date(date_or_list)
+
+
+def _extract_rdap_fields(whois_dict: Dict[str, Any]) -> Dict[str, Any]:
+  """
+  Map the whois dict of an RDAP response to the DomainLookupField fields
+  """
+  get = whois_dict.get
+  return {
+    DomainLookupField.REGISTRANT_NAME: get("registrant_name"),
+    DomainLookupField.REGISTRAR_NAME: get("registrar_name"),
+    DomainLookupField.STATUS: get("status"),
+    DomainLookupField.NAMESERVERS: get("nameservers"),
+    DomainLookupField.EXPIRES: _parse_optional_whois_date(get("expires")),
+    DomainLookupField.UPDATED: _parse_optional_whois_date(get("updated")),
+    DomainLookupField.CREATED: _parse_optional_whois_date(get("created")),
+  }
+
+
+def _extract_whois_fields(whois_dict: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+  """
+  Map the output of the whois parser to the DomainLookupField fields
+  """
+  get = (whois_dict if whois_dict is not None else {}).get
+  return {
+    DomainLookupField.REGISTRANT_NAME: get("registrant"),
+    DomainLookupField.REGISTRAR_NAME: get("registrar"),
+    DomainLookupField.STATUS: get("status"),
+    DomainLookupField.NAMESERVERS: get("name_servers"),
+    DomainLookupField.EXPIRES: _parse_optional_whois_date(get("expiration_date")),
+    DomainLookupField.UPDATED: _parse_optional_whois_date(get("updated_date")),
+    DomainLookupField.CREATED: _parse_optional_whois_date(get("creation_date")),
+  }
+
+
 T1 = TypeVar("T1")
 T2 = TypeVar("T2")
 
+_MISSING = object()
+
+# The RDAP records are the most complete, so we refresh them more often than the whois records, which rarely change and are slow to fetch
+RDAP_CACHE_TTL_SECONDS = 24 * 60 * 60
+WHOIS_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+
+
+class LruTtlCache:
+  """
+  A dict-like cache that holds at most maxsize entries, evicting the least recently used entry first, and that expires entries ttl seconds after they are set
+  """
+
+  def __init__(self, maxsize: int = 100000, default_ttl: float = RDAP_CACHE_TTL_SECONDS):
+    self.maxsize = maxsize
+    self.default_ttl = default_ttl
+    self.key_to_expiry_and_value: "OrderedDict[T1, Tuple[float, T2]]" = OrderedDict()
+
+  def __len__(self) -> int:
+    return len(self.key_to_expiry_and_value)
+
+  def get(self, key: T1, default: Any = None) -> Any:
+    expiry_and_value = self.key_to_expiry_and_value.get(key)
+    if expiry_and_value is None:
+      return default
+    elif expiry_and_value[0] <= time.monotonic():
+      del self.key_to_expiry_and_value[key]
+      return default
+    self.key_to_expiry_and_value.move_to_end(key)
+    return expiry_and_value[1]
+
+  def set(self, key: T1, value: T2, ttl: Optional[float] = None):
+    self.key_to_expiry_and_value[key] = (time.monotonic() + (self.default_ttl if ttl is None else ttl), value)
+    self.key_to_expiry_and_value.move_to_end(key)
+    if len(self.key_to_expiry_and_value) > self.maxsize:
+      self.key_to_expiry_and_value.popitem(last=False)
+
+
 class AsyncCache:
 
-  def __init__(self, async_fn: Callable[[T1], Coroutine], time_delay: int = 2, verbose: bool = False):
-    self.request_set = set()
-    self.cache = {}
+  def __init__(self, async_fn: Callable[[T1], Coroutine], cache: "Optional[LruTtlCache]" = None, verbose: bool = False):
+    self.pending: Dict[T1, asyncio.Task] = {}
+    self.task_to_waiter_count: Dict[asyncio.Task, int] = {}
+    self.cache = cache if cache is not None else LruTtlCache()
     self.async_fn = async_fn
-    self.time_delay = time_delay
     self.verbose = verbose
 
   async def run(self, key: T1, **kwargs) -> T2:
     """
-    This is a method that captures an async-await cache pattern
+    This is a method that captures an async-await cache pattern. The first caller for a key starts a task that runs async_fn and every concurrent caller for the same key awaits that task
     """
-    while True:
-      if key in self.request_set:
-        # This is being processed on another thread. Go to sleep for a few seconds before checking again.
-        if self.verbose:
-          print(f"[AsyncCache] with fn: {self.async_fn} sleeping on {key}")
-        await asyncio.sleep(self.time_delay)
-      elif key in self.cache:
-        return self.cache[key]
-      else:
-        # First add the key to the request_set synchronously so no other thread will try to process it
-        assert key not in self.request_set
-        self.request_set.add(key)
-
-        # Await the result of the async_fn
-        value = await self.async_fn(key, **kwargs)
-
-        # Add the value to the cache and remove the key from the request set
-        self.cache[key] = value
-        self.request_set.remove(key)
-        assert key not in self.request_set
-        return self.cache[key]
+    value = self.cache.get(key, _MISSING)
+    if value is not _MISSING:
+      return value
+
+    task = self.pending.get(key)
+    if task is None:
+      # Add the task to pending synchronously so no other coroutine will try to process the key
+      task = asyncio.ensure_future(self.async_fn(key, **kwargs))
+      self.pending[key] = task
+      task.add_done_callback(functools.partial(self._on_task_done, key))
+    elif self.verbose:
+      # This is being processed by another coroutine, so wait for it to finish
+      logger.debug("[AsyncCache] with fn: %s waiting on %s", self.async_fn, key)
+
+    self.task_to_waiter_count[task] = self.task_to_waiter_count.get(task, 0) + 1
+    try:
+      # NOTE: The shield means that a caller that is cancelled does not cancel the lookup for the other callers of the same key
+      return await asyncio.shield(task)
+    finally:
+      self.task_to_waiter_count[task] -= 1
+      if self.task_to_waiter_count[task] == 0:
+        del self.task_to_waiter_count[task]
+        # Once every caller has been cancelled nobody is waiting on the lookup, so we stop it instead of letting it run in the background
+        if not task.done():
+          task.cancel()
+          # The task can take a while to unwind, so we drop it from pending now to keep a later caller from awaiting a task that is being cancelled
+          self.pending.pop(key, None)
+
+  def _on_task_done(self, key: T1, task: asyncio.Task):
+    # A newer task may have replaced this one in pending after it was cancelled
+    if self.pending.get(key) is task:
+      del self.pending[key]
+    # NOTE: Calling task.exception() also stops asyncio from warning about an exception that no caller retrieved
+    if not task.cancelled() and task.exception() is None:
+      self.cache.set(key, task.result())
 
 class DomainLookupTool:
 
@@ -117,31 +251,37 @@ class DomainLookupTool:
   """
   This class serves as an interface to RDAP and Whois APIs that caches calls for particular domains
   """
-  FIELD_TO_RDAP_EXTRACTOR = {
-    DomainLookupField.REGISTRANT_NAME: lambda whois_dict: whois_dict.get("registrant_name"),
-    DomainLookupField.REGISTRAR_NAME: lambda whois_dict: whois_dict.get("registrar_name"),
-    DomainLookupField.STATUS:  lambda whois_dict: whois_dict.get("status"),
-    DomainLookupField.NAMESERVERS:lambda whois_dict: whois_dict.get("nameservers"),
-    DomainLookupField.EXPIRES: lambda whois_dict: None if whois_dict.get("expires") is None else _parse_whois_date(whois_dict["expires"]),
-    DomainLookupField.UPDATED: lambda whois_dict: None if whois_dict.get("updated") is None else _parse_whois_date(whois_dict["updated"]),
-    DomainLookupField.CREATED: lambda whois_dict: None if whois_dict.get("created") is None else _parse_whois_date(whois_dict["created"]),
-  }
 
-  FIELD_TO_WHOIS_EXTRACTOR = {
-    DomainLookupField.REGISTRANT_NAME: lambda whois_dict: whois_dict.get("registrant"),
-    DomainLookupField.REGISTRAR_NAME: lambda whois_dict: whois_dict.get("registrar"),
-    DomainLookupField.STATUS: lambda whois_dict: whois_dict.get("status"),
-    DomainLookupField.NAMESERVERS: lambda whois_dict: whois_dict.get("name_servers"),
-    DomainLookupField.EXPIRES: lambda whois_dict: None if whois_dict.get("expiration_date") is None else _parse_whois_date(whois_dict["expiration_date"]),
-    DomainLookupField.UPDATED: lambda whois_dict: None if whois_dict.get("updated_date") is None else _parse_whois_date(whois_dict["updated_date"]),
-    DomainLookupField.CREATED: lambda whois_dict: None if whois_dict.get("creation_date") is None else _parse_whois_date(whois_dict["creation_date"]),
-  }
+  def __init__(self, cache_maxsize: int = 100000, max_whois_workers: int = 8, verbose: bool = False):
+    # The whois library blocks on network and parsing, so its calls run on a small pool of threads to keep them off the event loop
+    self.whois_executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_whois_workers, thread_name_prefix="whois")
+    self.rdap_cache = AsyncCache(
+      self._get_rdap_response_from_registered_domain,
+      cache=LruTtlCache(maxsize=cache_maxsize, default_ttl=RDAP_CACHE_TTL_SECONDS),
+      verbose=verbose
+    )
+    self.async_whois_cache = AsyncCache(
+      self._get_async_whois_response_from_registered_domain,
+      cache=LruTtlCache(maxsize=cache_maxsize, default_ttl=WHOIS_CACHE_TTL_SECONDS),
+      verbose=verbose
+    )
+    self.sync_whois_cache = AsyncCache(
+      self._get_sync_whois_response_from_registered_domain,
+      cache=LruTtlCache(maxsize=cache_maxsize, default_ttl=WHOIS_CACHE_TTL_SECONDS),
+      verbose=verbose
+    )
 
+  def __enter__(self) -> "DomainLookupTool":
+    return self
 
-  def __init__(self, verbose: bool = False):
-    self.rdap_cache = AsyncCache(self._get_rdap_response_from_registered_domain, verbose=verbose)
-    self.async_whois_cache = AsyncCache(self._get_async_whois_response_from_registered_domain, verbose=verbose)
-    self.sync_whois_cache = AsyncCache(self._get_sync_whois_response_from_registered_domain, verbose=verbose)
+  def __exit__(self, exc_type, exc_value, traceback):
+    self.close()
+
+  def close(self):
+    """
+    Shut down the whois threads. Lookups that have not started yet are cancelled
+    """
+    self.whois_executor.shutdown(wait=False, cancel_futures=True)
 
   async def _get_sync_whois_response_from_registered_domain(
     self,
@@ -152,19 +292,15 @@ class DomainLookupTool:
 
     This is the older domain lookup standard, but it will have data for ccTLD domains that RDAP does not support.
     """
-    print(f"RUNNING SYNC WHOIS LOOKUP FOR {registered_domain_name}")
+    logger.debug("RUNNING SYNC WHOIS LOOKUP FOR %s", registered_domain_name)
     try:
-      response_dict = whois.whois(registered_domain_name)
+      response_dict = await asyncio.get_running_loop().run_in_executor(self.whois_executor, whois.whois, registered_domain_name)
     except Exception as e:
       # NOTE: In the future we will want to distinguish between the different kinds of errors. For example, the `whodap.errors.NotFoundError` is likely indicative of something different than the `whodap.errors.RateLimitError`
-      logging.error(f"Error in _get_sync_whois_response_from_registered_domain on {registered_domain_name}: {e}")
+      logger.error("Error in _get_sync_whois_response_from_registered_domain on %s: %s", registered_domain_name, e)
       response_dict = {}
 
-    whois_field_to_value = {
-      field_name: whois_response_extractor(response_dict)
-      for field_name, whois_response_extractor in self.FIELD_TO_WHOIS_EXTRACTOR.items()
-    }
-    return whois_field_to_value
+    return _extract_whois_fields(response_dict)
   
   async def get_sync_whois_response_from_registered_domain(
     self,
@@ -182,14 +318,14 @@ class DomainLookupTool:
 
     This is the older domain lookup standard, but it will have data for ccTLD domains that RDAP does not support.
     """
-    print(f"RUNNING ASYNC WHOIS LOOKUP FOR {registered_domain_name}")
+    logger.debug("RUNNING ASYNC WHOIS LOOKUP FOR %s", registered_domain_name)
     try:
       # NOTE: The asyncwhois package does not work for whois queries
       # raw_response = whois.query(registered_domain_name)
       query_output = (await asyncwhois.aio_whois_domain(registered_domain_name)).query_output
     except Exception as e:
       # NOTE: In the future we will want to distinguish between the different kinds of errors. For example, the `whodap.errors.NotFoundError` is likely indicative of something different than the `whodap.errors.RateLimitError`
-      logging.error(f"Error in _get_async_whois_response_from_registered_domain on {registered_domain_name}: {e}")
+      logger.error("Error in _get_async_whois_response_from_registered_domain on %s: %s", registered_domain_name, e)
       response_dict = {}
     else:
       # NOTE: This is an OSS contribution candidate
@@ -198,13 +334,11 @@ class DomainLookupTool:
       # TODO: Potentially switch to https://github.com/DannyCork/python-whois/blob/83112c5fb8e15abd7f9c9a69653e22896299ac3d/whois/__init__.py#L169 if you want to improve parsing
       response_dict = (
         None if query_output is None else
-        whois.parser.WhoisEntry.load(registered_domain_name, query_output)
+        await asyncio.get_running_loop().run_in_executor(
+          self.whois_executor, whois.parser.WhoisEntry.load, registered_domain_name, query_output
+        )
       )
-    whois_field_to_value = {
-      field_name: whois_response_extractor(response_dict)
-      for field_name, whois_response_extractor in self.FIELD_TO_WHOIS_EXTRACTOR.items()
-    }
-    return whois_field_to_value
+    return _extract_whois_fields(response_dict)
   
   async def get_async_whois_response_from_registered_domain(
     self,
@@ -223,8 +357,8 @@ class DomainLookupTool:
 
     This is the newer domain lookup standard, but it will not cover ccTLD domains
     """
-    print(f"RUNNING RDAP LOOKUP FOR {registered_domain_name}")
-    tld_extract_result = tldextract.extract(registered_domain_name)
+    logger.debug("RUNNING RDAP LOOKUP FOR %s", registered_domain_name)
+    tld_extract_result = extract_tld(registered_domain_name)
     extracted_domain_name = tld_extract_result.domain
     tld = tld_extract_result.suffix.split(".")[-1]
     try:
@@ -242,15 +376,10 @@ class DomainLookupTool:
     except Exception as e:
       # NOTE: In the future we will want to distinguish between the different kinds of errors. For example, the `whodap.errors.NotFoundError` is likely indicative of something different than the `whodap.errors.RateLimitError`
       if verbose:
-        print(f"Error in get_rdap_response_from_domain on {registered_domain_name}: {e}")
+        logger.error("Error in get_rdap_response_from_domain on %s: %s", registered_domain_name, e)
       response_dict = {}
       
-    rdap_field_to_value = {
-      field_name: (None if field_name not in response_dict else rdap_response_extractor(response_dict))
-      for field_name, rdap_response_extractor in self.FIELD_TO_RDAP_EXTRACTOR.items()
-    }
-
-    return rdap_field_to_value
+    return _extract_rdap_fields(response_dict)
   
   async def get_rdap_response_from_registered_domain(
     self,
@@ -261,6 +390,15 @@ class DomainLookupTool:
     return await self.rdap_cache.run(registered_domain_name, httpx_client=httpx_client, verbose=verbose)
 
 
+# The tool that from_fqdn uses when it is not passed one. It is created on first use and shared, so that its caches and whois threads are reused across calls
+_default_domain_lookup_tool: Optional[DomainLookupTool] = None
+
+def get_default_domain_lookup_tool() -> DomainLookupTool:
+  global _default_domain_lookup_tool
+  if _default_domain_lookup_tool is None:
+    _default_domain_lookup_tool = DomainLookupTool()
+  return _default_domain_lookup_tool
+
 
 class DomainLookupResponse(BaseModel):
   # NOTE: These need to be a superset of the fields on DomainLookupField
@@ -298,41 +436,55 @@ class DomainLookupResponse(BaseModel):
   ) -> "DomainLookupResponse":
     
     registered_domain_name = get_rdn_from_url(fqdn)
-    domain_lookup_tool = domain_lookup_tool if domain_lookup_tool is not None else DomainLookupTool()
+    domain_lookup_tool = domain_lookup_tool if domain_lookup_tool is not None else get_default_domain_lookup_tool()
     httpx_client = httpx_client if httpx_client is not None else httpx.AsyncClient(verify=False)
     
-    whois_rdap_field_to_value = {}
-    # RDAP is the first try
+    # Run the RDAP and async whois lookups concurrently
+    lookup_task_list = []
     if try_rdap:
-      whois_rdap_field_to_value = await domain_lookup_tool.get_rdap_response_from_registered_domain(
+      lookup_task_list.append(asyncio.ensure_future(domain_lookup_tool.get_rdap_response_from_registered_domain(
         registered_domain_name=registered_domain_name,
         httpx_client=httpx_client,
         verbose=verbose
-      )
-      
-    # Then try async whois
+      )))
     if try_async_whois:
-      if any([whois_rdap_field_to_value.get(response) is None for response in CRITICAL_DOMAIN_LOOKUP_FIELDS]):
-        async_whois_response = await domain_lookup_tool.get_async_whois_response_from_registered_domain(registered_domain_name=registered_domain_name)
-        for field_name, field_value in async_whois_response.items():
-          if whois_rdap_field_to_value.get(field_name) is None:
-            whois_rdap_field_to_value[field_name] = field_value
-
-    # Final fallback is sync whois (slow)
-    if any([whois_rdap_field_to_value.get(response) is None for response in CRITICAL_DOMAIN_LOOKUP_FIELDS]):
-      sync_whois_response = await domain_lookup_tool.get_sync_whois_response_from_registered_domain(registered_domain_name=registered_domain_name)
-      for field_name, field_value in sync_whois_response.items():
-        if whois_rdap_field_to_value.get(field_name) is None:
-          whois_rdap_field_to_value[field_name] = field_value
+      lookup_task_list.append(asyncio.ensure_future(
+        domain_lookup_tool.get_async_whois_response_from_registered_domain(registered_domain_name=registered_domain_name)
+      ))
+
+    # The sync whois lookup is slow, so it is only a fallback for when the other lookups have all finished without the critical fields
+    is_sync_whois_started = False
+    whois_rdap_field_to_value = {}
+    remaining_task_set = set(lookup_task_list)
+    try:
+      while True:
+        if len(remaining_task_set) == 0:
+          if is_sync_whois_started:
+            break
+          is_sync_whois_started = True
+          lookup_task_list.append(asyncio.ensure_future(
+            domain_lookup_tool.get_sync_whois_response_from_registered_domain(registered_domain_name=registered_domain_name)
+          ))
+          remaining_task_set = {lookup_task_list[-1]}
+        _, remaining_task_set = await asyncio.wait(remaining_task_set, return_when=asyncio.FIRST_COMPLETED)
+
+        # Merge the finished lookups in priority order (RDAP, then async whois, then sync whois), keeping the first value that is not None for each field
+        whois_rdap_field_to_value = {}
+        for task in lookup_task_list:
+          if task.done():
+            for field_name, field_value in task.result().items():
+              if whois_rdap_field_to_value.get(field_name) is None:
+                whois_rdap_field_to_value[field_name] = field_value
+        if all([whois_rdap_field_to_value.get(response) is not None for response in CRITICAL_DOMAIN_LOOKUP_FIELDS]):
+          break
+    finally:
+      # NOTE: AsyncCache cancels the underlying lookup once none of its callers are waiting on it
+      for task in remaining_task_set:
+        task.cancel()
 
     # NOTE: We need to use safe_to_str because whois data is not consistently normalized, some fields might be lists sometimes and strings other times
-    return cls(
+    # NOTE: safe_to_str already makes every field a string or None, so we can skip the pydantic validation
+    return cls.model_construct(
       fqdn=fqdn,
-      registrant_name=safe_to_str(whois_rdap_field_to_value.get("registrant_name")),
-      registrar_name=safe_to_str(whois_rdap_field_to_value.get("registrar_name")),
-      status=safe_to_str(whois_rdap_field_to_value.get("status")),
-      nameservers=safe_to_str(whois_rdap_field_to_value.get("nameservers")),
-      expires=safe_to_str(whois_rdap_field_to_value.get("expires")),
-      updated=safe_to_str(whois_rdap_field_to_value.get("updated")),
-      created=safe_to_str(whois_rdap_field_to_value.get("created"))
+      **{field_name: safe_to_str(whois_rdap_field_to_value.get(field_name)) for field_name in DOMAIN_LOOKUP_FIELDS}
     )
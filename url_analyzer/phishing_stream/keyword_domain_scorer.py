@@ -1,32 +1,49 @@
 # Inspired by https://github.com/x0rz/phishing_catcher
+import bisect
+from collections import Counter
 import math as math
 import re
-import tqdm
+import ahocorasick
 import yaml
 import os
-from Levenshtein import distance
+from typing import List, Tuple
+from rapidfuzz.distance import Levenshtein
 from tld import get_tld
 
 from confusables import normalize
 
+from url_analyzer.classification.utilities.utilities import YAML_SAFE_LOADER
+
 CERTSTREAM_URL = 'wss://certstream.calidog.io'
 CONFIG_ROOT_PATH = os.path.join(os.path.dirname(__file__), "../../configs")
 SUSPICIOUS_DOMAIN_KEYWORDS_CONFIG_PATH = os.path.join(CONFIG_ROOT_PATH, "suspicious_domain_keywords.yaml")
 
-pbar = tqdm.tqdm(desc='certificate_update', unit='cert')
+NON_WORD_PATTERN = re.compile(r"\W+")
 
 
 def entropy(string):
   """Calculates the Shannon entropy of a string"""
-  prob = [ float(string.count(c)) / len(string) for c in dict.fromkeys(list(string)) ]
-  entropy = - sum([ p * math.log(p) / math.log(2.0) for p in prob ])
-  return entropy
+  # NOTE: Counter counts every character in one pass, where calling string.count per distinct character is quadratic
+  length = len(string)
+  return - sum([ count / length * math.log2(count / length) for count in Counter(string).values() ])
 
 class KeywordDomainScorer:
 
   def __init__(self):
     with open(SUSPICIOUS_DOMAIN_KEYWORDS_CONFIG_PATH, 'r') as f:
-      self.config = yaml.safe_load(f)
+      self.config = yaml.load(f, Loader=YAML_SAFE_LOADER)
+
+    # An Aho-Corasick automaton finds every keyword that occurs in a domain in a single scan of the domain
+    self.keyword_automaton = ahocorasick.Automaton()
+    for k in self.config['keywords']:
+      self.keyword_automaton.add_word(k, k)
+    self.keyword_automaton.make_automaton()
+
+    # The strong keywords (>= 70 points) grouped by length, since a word can only be one edit away from keywords whose length differs from its own by at most one
+    self.strong_keyword_length_to_keyword_list = {}
+    for k, s in self.config['keywords'].items():
+      if s >= 70:
+        self.strong_keyword_length_to_keyword_list.setdefault(len(str(k)), []).append(str(k))
   
   def score_domain(self, domain: str) -> int:
     """Score `domain`.
@@ -39,6 +56,50 @@ class KeywordDomainScorer:
     Returns:
       int: the score of `domain`.
     """
+    score, normalized_domain = self._score_domain_without_keywords(domain=domain)
+
+    # Testing keywords
+    # NOTE: Each keyword counts once no matter how many times it occurs, so we dedupe the matches
+    for word in {word for _, word in self.keyword_automaton.iter(normalized_domain)}:
+      score += self.config['keywords'][word]
+    return score
+
+  def score_many(self, domain_list: List[str]) -> List[int]:
+    """Score every domain in `domain_list`, as score_domain would.
+
+    The keywords of all of the domains are matched in a single scan of the joined domains.
+
+    Args:
+      domain_list (List[str]): the domains to check.
+
+    Returns:
+      List[int]: the score of each domain in `domain_list`.
+    """
+    score_list = []
+    normalized_domain_list = []
+    for domain in domain_list:
+      score, normalized_domain = self._score_domain_without_keywords(domain=domain)
+      score_list.append(score)
+      normalized_domain_list.append(normalized_domain)
+
+    # NOTE: No keyword contains a newline, so no match can span two of the joined domains
+    domain_start_index_list = []
+    start_index = 0
+    for normalized_domain in normalized_domain_list:
+      domain_start_index_list.append(start_index)
+      start_index += len(normalized_domain) + 1
+    matched_index_and_word_set = {
+      (bisect.bisect_right(domain_start_index_list, end_index) - 1, word)
+      for end_index, word in self.keyword_automaton.iter("\n".join(normalized_domain_list))
+    }
+    for index, word in matched_index_and_word_set:
+      score_list[index] += self.config['keywords'][word]
+    return score_list
+
+  def _score_domain_without_keywords(self, domain: str) -> Tuple[int, str]:
+    """
+    Return the score of `domain` from everything except the keyword matches, along with the normalized domain that the keywords should be matched against
+    """
     score = 0
     for t in self.config['tlds']:
       if domain.endswith(t):
@@ -61,31 +122,31 @@ class KeywordDomainScorer:
     # Remove lookalike characters using list from http://www.unicode.org/reports/tr39
     domain = normalize(domain)[0]
 
-    words_in_domain = re.split("\W+", domain)
+    words_in_domain = NON_WORD_PATTERN.split(domain)
 
     # ie. detect fake .com (ie. *.com-account-management.info)
     if words_in_domain[0] in ['com', 'net', 'org']:
       score += 10
 
-    # Testing keywords
-    for word in self.config['keywords']:
-      if word in domain:
-        score += self.config['keywords'][word]
-
     # Testing Levenshtein distance for strong keywords (>= 70 points) (ie. paypol)
-    for key in [k for (k,s) in self.config['keywords'].items() if s >= 70]:
+    for word in words_in_domain:
       # Removing too generic keywords (ie. mail.domain.com)
-      for word in [w for w in words_in_domain if w not in ['email', 'mail', 'cloud']]:
-        if distance(str(word), str(key)) == 1:
-          score += 70
+      if word in ('email', 'mail', 'cloud'):
+        continue
+      for length in (len(word) - 1, len(word), len(word) + 1):
+        for key in self.strong_keyword_length_to_keyword_list.get(length, ()):
+          # NOTE: score_cutoff lets rapidfuzz stop as soon as the distance is known to be more than 1
+          if Levenshtein.distance(word, key, score_cutoff=1) == 1:
+            score += 70
 
     # Lots of '-' (ie. www.paypal-datacenter.com-acccount-alert.com)
-    if 'xn--' not in domain and domain.count('-') >= 4:
-      score += domain.count('-') * 3
+    hyphen_count = domain.count('-')
+    if hyphen_count >= 4 and 'xn--' not in domain:
+      score += hyphen_count * 3
 
     # Deeply nested subdomains (ie. www.paypal.com.security.accountupdate.gq)
-    if domain.count('.') >= 3:
-      score += domain.count('.') * 3
+    dot_count = domain.count('.')
+    if dot_count >= 3:
+      score += dot_count * 3
 
-
-    return score
+    return score, domain
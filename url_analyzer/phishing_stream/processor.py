@@ -1,31 +1,38 @@
 # Inspired by https://github.com/x0rz/phishing_catcher
 import asyncio
+import atexit
+import concurrent.futures
 import datetime
+import functools
+import logging
 import os
-from typing import Optional
+import threading
+from typing import List, Optional
 import uuid
 
 import httpx
-import tldextract
 import tqdm
 from termcolor import colored
 
 from url_analyzer.phishing_stream.keyword_domain_scorer import KeywordDomainScorer
-from url_analyzer.domain_analysis.domain_lookup import DomainLookupResponse, DomainLookupTool
+from url_analyzer.domain_analysis.domain_lookup import DomainLookupResponse, DomainLookupTool, TLD_EXTRACT_CACHE_SIZE, get_rdn_from_url
 from url_analyzer.domain_analysis.domain_classification import DomainClassificationResponse
-from url_analyzer.domain_analysis.config_manager import ConfigManager
+from url_analyzer.domain_analysis.config_manager import get_config_manager
 
 LOGS_ROOT_PATH = os.path.join(os.path.dirname(__file__), "../../outputs/suspicious_domains")
 
-pbar = tqdm.tqdm(desc='certificate_update', unit='cert')
-
 
 WHITELISTED_DOMAINS = ["amazonaws.com", "appdomain.cloud"]
 
-def get_rdn_from_url(url: str) -> str:
-  tld_extract_result = tldextract.extract(url)
-  return tld_extract_result.registered_domain
+# The maximum number of domain lookups that can be in flight at once, so that bursts of certificate updates do not exhaust sockets or trip the whois rate limits
+MAX_CONCURRENT_DOMAIN_LOOKUPS = 64
+# The maximum number of certificate updates that can wait to be scored before the certstream callback blocks
+MAX_PENDING_CERTIFICATE_UPDATES = 1000
+
+# Domains created or updated more recently than this are more likely to be phishing
+RECENT_DOMAIN_MAX_AGE = datetime.timedelta(days=30)
 
+@functools.lru_cache(maxsize=TLD_EXTRACT_CACHE_SIZE)
 def get_rdn_from_fqdn(fqdn: str) -> str:
   return get_rdn_from_url("http://" + fqdn)
 
@@ -34,32 +41,80 @@ def get_log_file_name() -> str:
   return os.path.join(LOGS_ROOT_PATH, str(datetime.datetime.now()) + str(uuid.uuid4())[:4])
 
 
-def is_created_or_updated_in_last_30_days(domain_lookup_response: DomainLookupResponse) -> Optional[bool]:
+# The same whois dates show up for many domains, so we cache the parses
+parse_iso_datetime = functools.lru_cache(maxsize=4096)(datetime.datetime.fromisoformat)
+
+
+def is_created_or_updated_in_last_30_days(
+  domain_lookup_response: DomainLookupResponse,
+  current_date: Optional[datetime.datetime] = None
+) -> Optional[bool]:
   # Parse the ISO formatted string into a datetime object
-  # Get the current date and time
-  current_date = datetime.datetime.now()
+  # Get the current date and time, unless the caller passes it in for a batch of responses
+  current_date = current_date if current_date is not None else datetime.datetime.now()
   if domain_lookup_response.created is None or domain_lookup_response.updated is None:
     output = None
   else:
-    created_delta = current_date - datetime.datetime.fromisoformat(domain_lookup_response.created)
+    created_delta = current_date - parse_iso_datetime(domain_lookup_response.created)
     
-    updated_delta = current_date - datetime.datetime.fromisoformat(domain_lookup_response.updated)
+    updated_delta = current_date - parse_iso_datetime(domain_lookup_response.updated)
 
     # Return True if the difference is more than 30 days, otherwise False
-    output = created_delta < datetime.timedelta(days=30) or updated_delta < datetime.timedelta(days=30)
+    output = created_delta < RECENT_DOMAIN_MAX_AGE or updated_delta < RECENT_DOMAIN_MAX_AGE
   return output
 
 class Processor:
   # Wrapper class
 
+  # Scores below this are not printed
+  min_printed_score = 65
+  # If issued from a free CA = more suspicious
+  free_ca_score_bonus = 10
+  # The largest factor by which the whois signal can raise a score
+  whois_max_score_multiplier = 1.2
+  # The domain reputation check can only lower the score, so it only runs on domains that could still score high enough to be printed
+  reputation_min_score = min_printed_score - free_ca_score_bonus
+
   def __init__(self, run_whois: bool = True):
     self.run_whois = run_whois
     self.domain_log = get_log_file_name()
+    # NOTE: The log file is kept open and flushed once per certificate update, rather than reopened for every suspicious domain
+    os.makedirs(os.path.dirname(self.domain_log), exist_ok=True)
+    self.domain_log_file = open(self.domain_log, 'a', buffering=8192)
     self.keyword_scorer = KeywordDomainScorer()
+    # NOTE: The progress bar redraws at most every half second, since the certstream can send thousands of domains per second
+    self.pbar = tqdm.tqdm(desc='certificate_update', unit='cert', mininterval=0.5, maxinterval=2.0, miniters=100)
     self.score_cutoff = 100
     self.domain_lookup_tool = DomainLookupTool()
-    self.httpx_client = httpx.AsyncClient(verify=False)
-    self.config_manager = ConfigManager()
+    self.config_manager = get_config_manager()
+
+    # The domains are scored on a single long-lived event loop that runs on a background thread, so the lookup caches and the http connection pool are shared across certificate updates
+    self.loop = asyncio.new_event_loop()
+    self.loop_thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+    self.loop_thread.start()
+    self.httpx_client = asyncio.run_coroutine_threadsafe(self._create_httpx_client(), self.loop).result()
+    self.lookup_semaphore: Optional[asyncio.Semaphore] = None
+    self.pending_certificate_update_semaphore = threading.BoundedSemaphore(MAX_PENDING_CERTIFICATE_UPDATES)
+
+    atexit.register(self.close)
+
+  async def _create_httpx_client(self) -> httpx.AsyncClient:
+    # NOTE: http2 lets concurrent lookups to the same RDAP server share one TLS connection
+    return httpx.AsyncClient(
+      http2=True,
+      limits=httpx.Limits(max_connections=200, max_keepalive_connections=100),
+      timeout=httpx.Timeout(10.0, connect=5.0)
+    )
+
+  def close(self):
+    if self.loop.is_running():
+      if not self.httpx_client.is_closed:
+        asyncio.run_coroutine_threadsafe(self.httpx_client.aclose(), self.loop).result(timeout=5)
+      # NOTE: The loop thread has to stop before the log file is closed, since the domains that it is still scoring write to the file
+      self.loop.call_soon_threadsafe(self.loop.stop)
+    self.loop_thread.join(timeout=5)
+    self.domain_lookup_tool.close()
+    self.domain_log_file.close()
 
   def scale_score_by_domain_reputation(self, score: float, domain: str) -> float:
 
@@ -78,31 +133,37 @@ class Processor:
         score = score * 0.5
     return score
   
-  def scale_score_by_whois_signal(self, score: float, domain: str) -> float:
-    domain_lookup_response = asyncio.run(DomainLookupResponse.from_fqdn(
-      fqdn=domain,
-      try_rdap=False,
-      domain_lookup_tool=self.domain_lookup_tool,
-      httpx_client=self.httpx_client,
-      try_async_whois=False
-    ))
+  async def scale_score_by_whois_signal(self, score: float, domain: str) -> float:
+    if self.lookup_semaphore is None:
+      # NOTE: The semaphore is created here so that it is bound to the event loop on the background thread
+      self.lookup_semaphore = asyncio.Semaphore(MAX_CONCURRENT_DOMAIN_LOOKUPS)
+    async with self.lookup_semaphore:
+      domain_lookup_response = await DomainLookupResponse.from_fqdn(
+        fqdn=domain,
+        try_rdap=False,
+        domain_lookup_tool=self.domain_lookup_tool,
+        httpx_client=self.httpx_client,
+        try_async_whois=False
+      )
     created_or_updated_recently = is_created_or_updated_in_last_30_days(domain_lookup_response=domain_lookup_response)
     if created_or_updated_recently is not None:
       if created_or_updated_recently:
-        score = score * 1.2
+        score = score * self.whois_max_score_multiplier
       else:
         score = score * 0.8
     return score
 
-  def score_domain(self, domain: str, message: dict) -> float:
-    score = self.keyword_scorer.score_domain(domain=domain.lower())
-    if self.run_whois:
-      score = self.scale_score_by_whois_signal(score=score, domain=domain)
+  async def score_domain(self, domain: str, message: dict, keyword_score: Optional[int] = None) -> float:
+    score = keyword_score if keyword_score is not None else self.keyword_scorer.score_domain(domain=domain.lower())
+    # The whois lookup is far slower than the keyword scorer, so we skip it on domains that would not be printed even with the largest whois boost
+    if self.run_whois and score * self.whois_max_score_multiplier >= self.reputation_min_score:
+      score = await self.scale_score_by_whois_signal(score=score, domain=domain)
 
-    score = self.scale_score_by_domain_reputation(score=score, domain=domain)
+    if score >= self.reputation_min_score:
+      score = self.scale_score_by_domain_reputation(score=score, domain=domain)
     # If issued from a free CA = more suspicious
     if "Let's Encrypt" == message['data']['leaf_cert']['issuer']['O']:
-      score += 10
+      score += self.free_ca_score_bonus
     return score
 
   def print_score(self, domain: str, score: int):
@@ -118,12 +179,36 @@ class Processor:
       tqdm.tqdm.write(
         "[!] Likely  : "
         "{} (score={})".format(colored(domain, 'yellow', attrs=['underline']), score))
-    elif score >= 65:
+    elif score >= self.min_printed_score:
       tqdm.tqdm.write(
         "[+] Potential : "
         "{} (score={})".format(colored(domain, attrs=['underline']), score))
 
 
+  async def _score_and_log_domain(self, domain: str, message: dict, keyword_score: int):
+    score = await self.score_domain(domain=domain, message=message, keyword_score=keyword_score)
+
+    self.print_score(domain=domain, score=score)
+
+    if score >= self.score_cutoff:
+      self.domain_log_file.write("{}\n".format(domain))
+
+  async def score_domain_list(self, domain_list: List[str], message: dict):
+    """
+    Score the domains from a certificate update concurrently on the event loop
+    """
+    keyword_score_list = self.keyword_scorer.score_many(domain_list=[domain.lower() for domain in domain_list])
+    await asyncio.gather(*[
+      self._score_and_log_domain(domain=domain, message=message, keyword_score=keyword_score)
+      for domain, keyword_score in zip(domain_list, keyword_score_list)
+    ])
+    self.domain_log_file.flush()
+
+  def _on_score_domain_list_done(self, future: "concurrent.futures.Future"):
+    self.pending_certificate_update_semaphore.release()
+    if future.exception() is not None:
+      logging.error(f"Error in score_domain_list: {future.exception()}")
+
   def callback(self, message, context):
     """Callback handler for certstream events."""
     if message['message_type'] == "heartbeat":
@@ -131,14 +216,9 @@ class Processor:
 
     if message['message_type'] == "certificate_update":
       all_domains = message['data']['leaf_cert']['all_domains']
+      self.pbar.update(len(all_domains))
 
-      for domain in all_domains:
-        pbar.update(1)
-        score = self.score_domain(domain=domain, message=message)
-
-        self.print_score(domain=domain, score=score)
-
-        if score >= self.score_cutoff:
-          with open(self.domain_log, 'a') as f:
-            f.write("{}\n".format(domain))
-
+      # NOTE: This blocks the certstream thread when the event loop falls too far behind
+      self.pending_certificate_update_semaphore.acquire()
+      future = asyncio.run_coroutine_threadsafe(self.score_domain_list(domain_list=all_domains, message=message), self.loop)
+      future.add_done_callback(self._on_score_domain_list_done)